@@ -0,0 +1,454 @@
+from flask import Flask, render_template, Response, jsonify, request
+import cv2
+import time
+import os
+import atexit
+from .utils.vehicle_detection import VehicleDetector
+from .utils.video_stream import VideoStream
+from .utils.stream_registry import StreamRegistry, is_valid_stream_id
+from .utils.metrics import render_prometheus
+from .utils.stats_stream import StatsBroadcaster
+from .utils.event_log import CrossingLog
+from .utils.config import ConfigFile, config_path
+from .utils.jobs import JobQueue, save_upload
+from .utils.recorder import VideoRecorder
+from .utils.constants import *
+
+app = Flask(__name__)
+app.config['SECRET_KEY'] = 'dev-key-please-change'
+
+# Global variables
+detector = VehicleDetector(camera='main')
+is_camera_active = False
+is_video_mode = False
+stream = None
+video_path = None
+
+# Stats pushed to every dashboard
+stats_events = StatsBroadcaster()
+
+# Every line crossing of the main stream
+event_log = CrossingLog(os.path.join(EVENT_LOG_DIR, 'main.bin'))
+
+# Named streams, each running in its own process
+streams = StreamRegistry()
+atexit.register(streams.stop_all)
+
+# Uploaded videos analysed in the background
+jobs = JobQueue()
+atexit.register(jobs.shutdown)
+
+def init_camera():
+    """Try different camera indices and return working camera"""
+    try:
+        if not is_video_mode:
+            cap = cv2.VideoCapture(0)
+        else:
+            cap = cv2.VideoCapture(video_path)
+            
+        if cap and cap.isOpened():
+            if not is_video_mode:
+                cap.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
+                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
+                cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            return cap
+    except Exception as e:
+        print(f"Error initializing camera/video: {str(e)}")
+    return None
+
+@app.route('/')
+def dashboard():
+    return render_template('dashboard.html')
+
+@app.route('/video_feed')
+def video_feed():
+    if not stream or not is_camera_active:
+        return Response(status=404)
+    return Response(stream.frames(),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/start_camera')
+def start_camera():
+    global is_camera_active, stream, is_video_mode
+    
+    try:
+        if not is_camera_active:
+            is_video_mode = False
+            camera = init_camera()
+            if camera is None:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Failed to initialize camera'
+                }), 400
+                
+            stream = VideoStream(detector, camera, stats_events=stats_events,
+                                 event_log=event_log)
+            stream.start()
+            is_camera_active = True
+            return jsonify({
+                'status': 'started',
+                'message': 'Camera started successfully'
+            })
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/stop_camera')
+def stop_camera():
+    global is_camera_active, stream, is_video_mode
+    
+    try:
+        is_camera_active = False
+        is_video_mode = False
+        if stream:
+            stream.stop()
+            stream = None
+        stats_events.publish({
+            'current_count': detector.vehicle_count,
+            'average_speed': round(detector.last_avg_speed, 2),
+            'timestamp': time.time(),
+            'camera_status': 'inactive'
+        })
+        return jsonify({
+            'status': 'stopped',
+            'message': 'Camera/Video stopped successfully'
+        })
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/upload_video', methods=['POST'])
+def upload_video():
+    global stream, is_camera_active, is_video_mode, video_path
+    
+    try:
+        if 'video' not in request.files:
+            return jsonify({
+                'status': 'error',
+                'message': 'No video file uploaded'
+            }), 400
+            
+        video_file = request.files['video']
+        if video_file.filename == '':
+            return jsonify({
+                'status': 'error',
+                'message': 'No selected file'
+            }), 400
+            
+        # Each upload gets its own file so concurrent uploads cannot collide
+        new_path = save_upload(video_file.stream, video_file.filename)
+        
+        if stream:
+            stream.stop()
+            stream = None
+        if video_path and os.path.exists(video_path):
+            os.remove(video_path)
+        video_path = new_path
+        
+        is_video_mode = True
+        camera = init_camera()
+        if camera is None:
+            is_camera_active = False
+            return jsonify({
+                'status': 'error',
+                'message': 'Failed to open video'
+            }), 400
+            
+        stream = VideoStream(detector, camera, is_video=True, stats_events=stats_events,
+                             event_log=event_log)
+        stream.start()
+        is_camera_active = True
+        
+        return jsonify({
+            'status': 'success',
+            'message': 'Video uploaded and processing started'
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    try:
+        # Multipart form uploads, or the raw file as the request body
+        if 'video' in request.files:
+            video_file = request.files['video']
+            if video_file.filename == '':
+                return jsonify({
+                    'status': 'error',
+                    'message': 'No selected file'
+                }), 400
+            filename = video_file.filename
+            path = save_upload(video_file.stream, filename)
+        elif request.mimetype == 'application/octet-stream':
+            filename = request.args.get('filename', 'video.mp4')
+            path = save_upload(request.stream, filename)
+        else:
+            return jsonify({
+                'status': 'error',
+                'message': 'No video file uploaded'
+            }), 400
+            
+        job = jobs.submit(filename, path)
+        return jsonify({
+            'status': 'queued',
+            'message': 'Video queued for processing',
+            'job_id': job.id
+        }), 202
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    return jsonify({
+        'jobs': [job.describe() for job in jobs.list()]
+    })
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({
+            'status': 'error',
+            'message': f"Unknown job '{job_id}'"
+        }), 404
+    return jsonify(job.describe())
+
+@app.route('/jobs/<job_id>/results')
+def job_results(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({
+            'status': 'error',
+            'message': f"Unknown job '{job_id}'"
+        }), 404
+    if job.status != 'done':
+        return jsonify(dict(job.describe(), message='Job has not finished')), 409
+    return jsonify(dict(job.result, id=job.id, filename=job.filename))
+
+@app.route('/start_recording')
+def start_recording():
+    if not stream or not is_camera_active:
+        return jsonify({
+            'status': 'error',
+            'message': 'Camera/Video is not running'
+        }), 400
+    if stream.recorder is None:
+        fps = stream.clock.fps if is_video_mode else FPS
+        stream.recorder = VideoRecorder(prefix='main', fps=fps)
+    return jsonify(dict(stream.recorder.describe(), status='recording'))
+
+@app.route('/stop_recording')
+def stop_recording():
+    recorder = stream.recorder if stream else None
+    if recorder is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Not recording'
+        }), 400
+    stream.recorder = None
+    recorder.stop()
+    return jsonify(dict(recorder.describe(), status='stopped'))
+
+@app.route('/pause_video')
+def pause_video():
+    if stream:
+        stream.is_paused = request.args.get('paused') == 'true'
+    return jsonify({'status': 'success'})
+
+@app.route('/get_stats')
+def get_stats():
+    try:
+        current_count = detector.vehicle_count
+        current_speeds = detector.current_speeds
+        
+        avg_speed = sum(current_speeds) / len(current_speeds) if current_speeds else detector.last_avg_speed
+        
+        return jsonify({
+            'current_count': current_count,
+            'average_speed': round(avg_speed, 2),
+            'timestamp': time.time(),
+            'camera_status': 'active' if is_camera_active and stream and stream.is_running else 'inactive',
+            'windows': {str(seconds): detector.history.window(seconds) for seconds in STATS_WINDOWS}
+        })
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/stats/history')
+def stats_history():
+    try:
+        window = float(request.args.get('window', 600))
+        points = int(request.args.get('points', MAX_STATS_HISTORY))
+        if window <= 0 or points <= 0:
+            raise ValueError('window and points must be positive')
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+        
+    return jsonify(detector.history.series(window, min(points, MAX_STATS_HISTORY)))
+
+@app.route('/stats_stream')
+def stats_stream():
+    return Response(stats_events.events(),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/events/summary')
+def events_summary():
+    stream_id = request.args.get('stream', 'main')
+    try:
+        end = float(request.args.get('end', time.time()))
+        start = float(request.args.get('start', end - 3600))
+        bucket = float(request.args.get('bucket', 60))
+        if end <= start or bucket <= 0:
+            raise ValueError('end must be after start and bucket must be positive')
+        if (end - start) / bucket > 100000:
+            raise ValueError('Too many buckets; use a larger bucket size')
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+        
+    if stream_id == 'main':
+        log = event_log
+    elif not is_valid_stream_id(stream_id):
+        return jsonify({
+            'status': 'error',
+            'message': 'Invalid stream id'
+        }), 400
+    else:
+        path = os.path.join(EVENT_LOG_DIR, f"{stream_id}.bin")
+        if streams.get(stream_id) is None and not os.path.exists(path):
+            return jsonify({
+                'status': 'error',
+                'message': f"Unknown stream '{stream_id}'"
+            }), 404
+        log = CrossingLog(path)
+        
+    return jsonify(log.summary(start, end, bucket))
+
+def camera_config(camera):
+    # Detectors watch their config file, so writing it is all it takes
+    config = ConfigFile(config_path(camera))
+    try:
+        if request.method == 'GET':
+            return jsonify(config.load())
+        
+        values = request.get_json(silent=True)
+        if not isinstance(values, dict):
+            raise ValueError('Expected a JSON object of settings')
+        return jsonify({
+            'status': 'success',
+            'message': 'Settings saved; running detectors apply them within a second',
+            'config': config.update(values)
+        })
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+
+@app.route('/config', methods=['GET', 'POST'])
+def main_config():
+    return camera_config('main')
+
+@app.route('/streams', methods=['GET'])
+def list_streams():
+    return jsonify({
+        'streams': [handle.describe() for handle in streams.list()]
+    })
+
+@app.route('/streams', methods=['POST'])
+def add_stream():
+    data = request.get_json(silent=True) or request.form
+    stream_id = data.get('id')
+    source = data.get('source')
+    
+    if not stream_id or source is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Both id and source are required'
+        }), 400
+        
+    try:
+        streams.add(stream_id, source)
+        return jsonify({
+            'status': 'started',
+            'message': f"Stream '{stream_id}' started"
+        })
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/streams/<stream_id>', methods=['DELETE'])
+def remove_stream(stream_id):
+    if not streams.remove(stream_id):
+        return jsonify({
+            'status': 'error',
+            'message': f"Unknown stream '{stream_id}'"
+        }), 404
+    return jsonify({
+        'status': 'stopped',
+        'message': f"Stream '{stream_id}' stopped"
+    })
+
+@app.route('/streams/<stream_id>/video_feed')
+def stream_video_feed(stream_id):
+    handle = streams.get(stream_id)
+    if not handle or not handle.is_running:
+        return Response(status=404)
+    return Response(handle.frames(),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/streams/<stream_id>/stats')
+def stream_stats(stream_id):
+    handle = streams.get(stream_id)
+    if not handle:
+        return jsonify({
+            'status': 'error',
+            'message': f"Unknown stream '{stream_id}'"
+        }), 404
+    return jsonify(dict(handle.stats(), timestamp=time.time()))
+
+@app.route('/streams/<stream_id>/config', methods=['GET', 'POST'])
+def stream_config(stream_id):
+    if not is_valid_stream_id(stream_id):
+        return jsonify({
+            'status': 'error',
+            'message': 'Invalid stream id'
+        }), 400
+    return camera_config(stream_id)
+
+@app.route('/metrics')
+def metrics():
+    snapshots = {}
+    if stream and stream.is_running:
+        snapshots['main'] = stream.metrics.snapshot()
+    for handle in streams.list():
+        snapshots[handle.stream_id] = handle.metrics()
+        
+    return Response(render_prometheus(snapshots),
+                    mimetype='text/plain; version=0.0.4')
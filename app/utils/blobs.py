@@ -0,0 +1,56 @@
+import cv2
+import numpy as np
+
+
+def filter_blobs(boxes, areas, min_area, min_aspect, max_aspect):
+    """Keep [x, y, w, h] boxes with a vehicle-like area and width/height ratio."""
+    aspect = boxes[:, 2] / np.maximum(boxes[:, 3], 1)
+    keep = (areas >= min_area) & (aspect > min_aspect) & (aspect < max_aspect)
+    return boxes[keep]
+
+
+def contour_table(fg_mask):
+    """Boxes and areas of all outer contours of the mask, measured by contour area.
+
+    Contour area runs through the boundary pixel centres, so it is smaller
+    than component_table's pixel count (a solid w x h box gives (w-1)*(h-1)
+    against w*h). Boxes match; blobs right at min_area may not.
+    """
+    contours, _ = cv2.findContours(fg_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return np.zeros((0, 4), dtype=np.int32), np.zeros(0)
+
+    areas = np.array([cv2.contourArea(c) for c in contours])
+    boxes = np.array([cv2.boundingRect(c) for c in contours], dtype=np.int32)
+    return boxes, areas
+
+
+def component_table(fg_mask):
+    """Boxes and areas from one connectedComponentsWithStats pass, measured by pixel count."""
+    count, _, stats, _ = cv2.connectedComponentsWithStats(fg_mask, connectivity=8)
+
+    # Row 0 is the background
+    stats = stats[1:count]
+    boxes = stats[:, :4].astype(np.int32)
+    areas = stats[:, cv2.CC_STAT_AREA].astype(np.float64)
+    return boxes, areas
+
+
+def contour_blobs(fg_mask, min_area, min_aspect, max_aspect):
+    return filter_blobs(*contour_table(fg_mask), min_area, min_aspect, max_aspect)
+
+
+def component_blobs(fg_mask, min_area, min_aspect, max_aspect):
+    return filter_blobs(*component_table(fg_mask), min_area, min_aspect, max_aspect)
+
+
+BLOB_BACKENDS = {
+    'contours': contour_blobs,
+    'components': component_blobs
+}
+
+# Unfiltered blobs, for tools that try many filter settings on one mask
+BLOB_TABLES = {
+    'contours': contour_table,
+    'components': component_table
+}
@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+from .constants import *  # Import constants
+
+
+def fit_homography(image_points, world_points):
+    """Least-squares ground-plane homography from 4+ pixel/metre point pairs."""
+    image_points = np.asarray(image_points, dtype=np.float64)
+    world_points = np.asarray(world_points, dtype=np.float64)
+    if len(image_points) < 4 or len(image_points) != len(world_points):
+        raise ValueError('Need at least four matching image and world points')
+    homography, _ = cv2.findHomography(image_points, world_points, 0)
+    if homography is None:
+        raise ValueError('Points are degenerate; pick four or more points not on one line')
+
+    # findHomography fixes h33 = 1, which puts w < 0 on the road whenever the
+    # top-left pixel is above the horizon; flip so the clicked points have w > 0
+    u, v = image_points.mean(axis=0)
+    homography *= np.sign(homography[2] @ [u, v, 1.0]) or 1.0
+    return homography
+
+
+class GroundPlane:
+    """Maps frame pixels to metres on the road surface.
+
+    With a homography every pixel of the frame is projected once into a
+    lookup table, so mapping the centroids of all tracks is a single array
+    index per frame. Without one, pixels are scaled by METERS_PER_PIXEL.
+    """
+
+    def __init__(self, homography=None, image_size=None, meters_per_pixel=METERS_PER_PIXEL):
+        self.homography = None if homography is None else np.asarray(homography, dtype=np.float64)
+        self.image_size = image_size
+        self.meters_per_pixel = meters_per_pixel
+        self._table = None
+        self._table_size = None
+
+    def _build_table(self, width, height):
+        # Calibration may have been done at another resolution
+        calib_width, calib_height = self.image_size or (width, height)
+        u = (np.arange(width, dtype=np.float64) + 0.5) * calib_width / width
+        v = (np.arange(height, dtype=np.float64) + 0.5) * calib_height / height
+        uu, vv = np.meshgrid(u, v)
+
+        h = self.homography
+        denominator = h[2, 0] * uu + h[2, 1] * vv + h[2, 2]
+        # Pixels above the horizon have no ground position
+        denominator[denominator <= 1e-12] = np.nan
+        table = np.empty((height, width, 2), dtype=np.float32)
+        table[..., 0] = (h[0, 0] * uu + h[0, 1] * vv + h[0, 2]) / denominator
+        table[..., 1] = (h[1, 0] * uu + h[1, 1] * vv + h[1, 2]) / denominator
+        self._table = table
+        self._table_size = (width, height)
+
+    def to_world(self, points, frame_size):
+        """Metre coordinates of an (N, 2) array of pixel points; NaN off the ground."""
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        if self.homography is None:
+            return points * self.meters_per_pixel
+
+        width, height = frame_size
+        if self._table_size != (width, height):
+            self._build_table(width, height)
+        x = np.clip(points[:, 0].astype(np.int64), 0, width - 1)
+        y = np.clip(points[:, 1].astype(np.int64), 0, height - 1)
+        return self._table[y, x]
@@ -0,0 +1,200 @@
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from .constants import *  # Import constants
+
+# Settings a running detector can pick up, with their defaults
+DEFAULTS = {
+    'min_contour_area': MIN_CONTOUR_AREA,
+    'min_aspect_ratio': MIN_ASPECT_RATIO,
+    'max_aspect_ratio': MAX_ASPECT_RATIO,
+    'iou_threshold': IOU_THRESHOLD,
+    'blob_backend': BLOB_BACKEND,
+    'roi_mode': ROI_MODE,
+    'roi_band_height': ROI_BAND_HEIGHT,
+    'roi_polygon': ROI_POLYGON,
+    'processing_scale': PROCESSING_SCALE,
+    'bg_history': BG_HISTORY,
+    'bg_threshold': BG_THRESHOLD,
+    'bg_shadow': BG_SHADOW,
+    'meters_per_pixel': METERS_PER_PIXEL,
+    'homography': None,
+    'image_size': None,
+    'detection_line_position': DETECTION_LINE_POSITION
+}
+
+CHOICES = {
+    'blob_backend': ('contours', 'components'),
+    'roi_mode': ('full', 'band', 'polygon')
+}
+
+# Settings given as a fraction, and whether 0 is allowed
+FRACTIONS = {
+    'roi_band_height': False,
+    'processing_scale': False,
+    'detection_line_position': True,
+    'iou_threshold': True
+}
+
+# One lock per file, shared by every ConfigFile for that path
+_path_locks = {}
+_path_locks_guard = threading.Lock()
+
+
+def _path_lock(path):
+    with _path_locks_guard:
+        return _path_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def _is_number(value):
+    return (isinstance(value, (int, float)) and not isinstance(value, bool)
+            and math.isfinite(value))
+
+
+def config_path(camera):
+    return os.path.join(CONFIG_DIR, f"{camera}.json")
+
+
+def check_settings(settings):
+    """Checks across settings, on a full set; raises ValueError."""
+    if settings['min_aspect_ratio'] >= settings['max_aspect_ratio']:
+        raise ValueError("'min_aspect_ratio' must be below 'max_aspect_ratio'")
+    return settings
+
+
+def validate_config(values):
+    """Checked copy of a partial config; raises ValueError on bad keys or values."""
+    checked = {}
+    for key, value in values.items():
+        if key not in DEFAULTS:
+            raise ValueError(f"Unknown setting '{key}'")
+        default = DEFAULTS[key]
+        if value is None or default is None:
+            checked[key] = value
+        elif isinstance(default, bool):
+            if not isinstance(value, bool):
+                raise ValueError(f"'{key}' must be true or false")
+            checked[key] = value
+        elif isinstance(default, (int, float)):
+            try:
+                number = float(value)
+            except (TypeError, ValueError, OverflowError):
+                raise ValueError(f"'{key}' must be a number")
+            if not math.isfinite(number):
+                raise ValueError(f"'{key}' must be a number")
+            if isinstance(default, int) and not number.is_integer():
+                raise ValueError(f"'{key}' must be a whole number")
+            checked[key] = type(default)(number)
+            if checked[key] < 0:
+                raise ValueError(f"'{key}' must not be negative")
+            if key in FRACTIONS and (checked[key] > 1 or
+                                     (checked[key] == 0 and not FRACTIONS[key])):
+                limits = 'between 0 and 1' if FRACTIONS[key] else 'greater than 0 and at most 1'
+                raise ValueError(f"'{key}' must be {limits}")
+        elif isinstance(default, list):
+            if not isinstance(value, list):
+                raise ValueError(f"'{key}' must be a list")
+            checked[key] = value
+        else:
+            checked[key] = str(value)
+
+        if key in CHOICES and checked[key] not in CHOICES[key]:
+            raise ValueError(f"'{key}' must be one of {', '.join(CHOICES[key])}")
+
+    polygon = checked.get('roi_polygon')
+    if polygon is not None and any(
+            not isinstance(point, list) or len(point) != 2 or not all(map(_is_number, point))
+            for point in polygon):
+        raise ValueError("'roi_polygon' must be a list of [x, y] points")
+
+    # Calibration is stored as plain lists
+    homography = checked.get('homography')
+    if homography is not None and (
+            not isinstance(homography, list) or len(homography) != 3 or
+            any(not isinstance(row, list) or len(row) != 3 or not all(map(_is_number, row))
+                for row in homography)):
+        raise ValueError("'homography' must be a 3x3 list of numbers")
+    image_size = checked.get('image_size')
+    if image_size is not None and (
+            not isinstance(image_size, list) or len(image_size) != 2 or
+            not all(_is_number(v) and v > 0 for v in image_size)):
+        raise ValueError("'image_size' must be [width, height]")
+    return checked
+
+
+class ConfigFile:
+    """Per-camera settings in a JSON file, watched by the running detector.
+
+    The file holds only the values that differ from the defaults in
+    constants.py. Writers replace it atomically; readers check its
+    modification time at most every CONFIG_CHECK_SECONDS, so watching it
+    costs one stat call per interval.
+    """
+
+    def __init__(self, path, check_interval=CONFIG_CHECK_SECONDS):
+        self.path = path
+        self.check_interval = check_interval
+        self._stamp = None
+        self._next_check = 0.0
+        self._lock = _path_lock(path)
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+
+    def read(self):
+        """Overrides stored in the file."""
+        try:
+            with open(self.path) as f:
+                return validate_config(json.load(f))
+        except FileNotFoundError:
+            return {}
+
+    def load(self):
+        """Full settings: the defaults with the stored overrides applied."""
+        return check_settings(dict(DEFAULTS, **self.read()))
+
+    def poll(self):
+        """Full settings if the file changed since the last poll, else None."""
+        now = time.monotonic()
+        if now < self._next_check:
+            return None
+        self._next_check = now + self.check_interval
+
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return None
+        self._stamp = stamp
+        try:
+            return self.load()
+        except (OSError, ValueError) as e:
+            # Keep running on the last good settings
+            print(f"Error loading config {self.path}: {str(e)}")
+            return None
+
+    def update(self, values):
+        """Validate and store new overrides; returns the full settings."""
+        values = validate_config(values)
+        with self._lock:
+            stored = self.read()
+            stored.update(values)
+            settings = check_settings(dict(DEFAULTS, **stored))
+            directory = os.path.dirname(self.path) or '.'
+            os.makedirs(directory, exist_ok=True)
+            # A temp file of its own, in case another process writes too
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp',
+                                             prefix=os.path.basename(self.path))
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(stored, f, indent=4)
+                os.replace(temp_path, self.path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+        return settings
@@ -4,11 +4,35 @@ FRAME_WIDTH = 800
 FRAME_HEIGHT = 600
 JPEG_QUALITY = 70
 
+# Processing pipeline
+DECODE_QUEUE_SIZE = 4   # Decoded frames waiting for detection
+ENCODE_QUEUE_SIZE = 4   # Frames waiting to be annotated and encoded
+ENCODE_WORKERS = 2      # Threads annotating and JPEG encoding frames
+
+# Annotated video recording
+RECORD_DIR = 'data/recordings'        # Segment files of recorded streams
+RECORD_CODEC = 'mp4v'                 # FourCC passed to cv2.VideoWriter
+RECORD_EXTENSION = '.mp4'
+RECORD_QUEUE_SIZE = 16                # Frames waiting to be written; more are dropped
+RECORD_SEGMENT_SECONDS = 600          # Start a new file after this much capture time
+RECORD_SEGMENT_BYTES = 256 * 1024 * 1024  # or once the file reaches this size
+
+# Load shedding
+LOAD_SHEDDING = True    # Drop stale frames and skip detection when falling behind
+MAX_FRAME_SKIP = 5      # Run full detection at least every Nth frame
+
 # Vehicle detection
 MIN_CONTOUR_AREA = 4305.0  # Calibrated value
 MIN_ASPECT_RATIO = 0.4   # Width/Height ratio minimum
 MAX_ASPECT_RATIO = 2.5   # Width/Height ratio maximum
 IOU_THRESHOLD = 0.45
+BLOB_BACKEND = 'contours'  # 'contours' (findContours) or 'components' (connectedComponentsWithStats)
+
+# Region of interest
+ROI_MODE = 'full'        # 'full', 'band' (around the detection line) or 'polygon'
+ROI_BAND_HEIGHT = 0.4    # Band height as a fraction of frame height
+ROI_POLYGON = []         # Road outline in frame pixels, e.g. [(0, 200), (800, 200), (800, 600), (0, 600)]
+PROCESSING_SCALE = 1.0   # Downscale factor applied before detection (e.g. 0.5)
 
 # Background subtractor
 BG_HISTORY = 100
@@ -26,5 +50,42 @@ SPEED_HISTORY = 5  # Number of speed readings to average
 TRACKING_MEMORY = 1  # How many seconds to keep tracking a vehicle
 DETECTION_LINE_POSITION = 0.5  # Line position (0-1)
 
+# Uploads and background analysis jobs
+UPLOAD_DIR = 'app/static/uploads'
+UPLOAD_CHUNK_SIZE = 1 << 20     # Bytes copied per write when saving uploads
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+JOB_WORKERS = 2                 # Processes analysing uploaded videos
+JOB_NICENESS = 10               # Lower CPU priority of job workers than live streams
+JOB_PROGRESS_INTERVAL = 0.5     # Seconds between progress reports from a job
+
+# Detection cache for re-analysed videos
+DETECTION_CACHE_DIR = 'data/cache'       # One entry per video content and detection settings
+DETECTION_CACHE_MAX_BYTES = 1 << 30      # Least recently used entries are evicted beyond this
+
+# Per-camera settings, re-applied by running detectors when the file changes
+CONFIG_DIR = 'data/config'      # One <camera>.json per camera; 'main' is the dashboard camera
+CONFIG_CHECK_SECONDS = 1.0      # How often a detector checks its config file
+
 # Stats
-MAX_STATS_HISTORY = 50  # Maximum number of readings to keep for stats 
\ No newline at end of file
+MAX_STATS_HISTORY = 50  # Maximum number of readings returned by /stats/history
+STATS_STREAM_RATE = 4   # Maximum stats messages per second pushed to dashboards
+STATS_WINDOWS = (60, 900, 3600)  # Rolling windows in seconds reported by /get_stats
+
+# Rolling time series: (bucket seconds, bucket count) per resolution
+TIME_SERIES_LEVELS = [
+    (1, 600),       # 1 s buckets for the last 10 minutes
+    (60, 1440),     # 1 min buckets for the last day
+    (900, 2880)     # 15 min buckets for the last 30 days
+]
+TIME_SERIES_SPEED_STEP = 1  # km/h per speed histogram bin, sets p85 resolution
+
+# Metrics
+ENABLE_METRICS = True   # Per-stage timings for /metrics; False makes them no-ops
+METRICS_WINDOW = 1000   # Samples kept per stage for percentiles
+
+# Crossing event log
+EVENT_LOG_DIR = 'data/events'   # One binary log per stream
+EVENT_LOG_BATCH = 256           # Events buffered before a write
+EVENT_LOG_FLUSH_SECONDS = 5     # Longest time an event waits in the buffer
+LANE_COUNT = 3                  # Equal-width lanes across the frame
+SPEED_HISTOGRAM_BINS = list(range(0, MAX_SPEED + 10, 10))  # km/h bin edges
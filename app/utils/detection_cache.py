@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+import numpy as np
+from .constants import *  # Import constants
+
+CACHE_VERSION = 2  # Bump when detection output changes for the same settings
+
+_file_hashes = {}
+_file_hashes_lock = threading.Lock()
+
+
+def file_digest(path, chunk_size=UPLOAD_CHUNK_SIZE):
+    """Content hash of a file, remembered per path, size and modification time."""
+    stat = os.stat(path)
+    stamp = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _file_hashes_lock:
+        digest = _file_hashes.get(stamp)
+    if digest is None:
+        hasher = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+        with _file_hashes_lock:
+            _file_hashes[stamp] = digest
+    return digest
+
+
+def params_digest(*params):
+    data = json.dumps([CACHE_VERSION, *params], sort_keys=True, default=str)
+    return hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
+
+
+class DetectionCache:
+    """Per-frame detection output of analysed videos, kept on disk.
+
+    An entry holds the boxes found in every frame of one video slice for one
+    set of blob settings, as flat NumPy arrays that are memory-mapped on
+    replay. Results for each set of tracking settings are stored beside
+    them, so changing only tracking or speed settings replays the cached
+    boxes through tracking alone. Entries are evicted least recently used
+    first once the cache grows past max_bytes.
+    """
+
+    def __init__(self, directory=DETECTION_CACHE_DIR, max_bytes=DETECTION_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _entry(self, key):
+        return os.path.join(self.directory, key)
+
+    def _touch(self, entry):
+        # Directory modification time is the LRU clock
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+
+    def load_boxes(self, key):
+        """(boxes, offsets, timestamps) for an entry, memory-mapped, or None.
+
+        Frame i's boxes are boxes[offsets[i]:offsets[i + 1]].
+        """
+        entry = self._entry(key)
+        try:
+            arrays = tuple(
+                np.load(os.path.join(entry, f"{name}.npy"), mmap_mode='r')
+                for name in ('boxes', 'offsets', 'timestamps')
+            )
+        except (OSError, ValueError):
+            return None
+        self._touch(entry)
+        return arrays
+
+    def store_boxes(self, key, frame_boxes, timestamps):
+        """Store one (N, 4) box array per frame together with the frame timestamps."""
+        counts = [len(boxes) for boxes in frame_boxes]
+        offsets = np.zeros(len(frame_boxes) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        if frame_boxes:
+            boxes = np.concatenate(frame_boxes).astype(np.int32).reshape(-1, 4)
+        else:
+            boxes = np.zeros((0, 4), dtype=np.int32)
+
+        # Write beside the cache and move into place in one step
+        entry = self._entry(key)
+        temp = self._entry(f".{key}.{uuid.uuid4().hex}")
+        os.makedirs(temp)
+        np.save(os.path.join(temp, 'boxes.npy'), boxes)
+        np.save(os.path.join(temp, 'offsets.npy'), offsets)
+        np.save(os.path.join(temp, 'timestamps.npy'), np.asarray(timestamps, dtype=np.float64))
+        try:
+            os.rename(temp, entry)
+        except OSError:
+            # Another run stored the same entry first
+            shutil.rmtree(temp, ignore_errors=True)
+        self.evict()
+
+    def load_result(self, key, tracking_key):
+        path = os.path.join(self._entry(key), f"result-{tracking_key}.json")
+        try:
+            with open(path) as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._touch(self._entry(key))
+        return result
+
+    def store_result(self, key, tracking_key, result):
+        entry = self._entry(key)
+        if not os.path.isdir(entry):
+            return
+        path = os.path.join(entry, f"result-{tracking_key}.json")
+        temp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp, 'w') as f:
+            json.dump(result, f)
+        os.replace(temp, path)
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.directory):
+                entry = self._entry(name)
+                if name.startswith('.') or not os.path.isdir(entry):
+                    continue
+                try:
+                    size = sum(f.stat().st_size for f in os.scandir(entry) if f.is_file())
+                    entries.append((os.stat(entry).st_mtime, size, entry))
+                except OSError:
+                    continue  # Removed by another process meanwhile
+                total += size
+
+            for _, size, entry in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+import numpy as np
+from .constants import *  # Import constants
+
+# One fixed-width record per line crossing
+EVENT_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('track_id', '<i8'),
+    ('speed', '<f4'),
+    ('width', '<u2'),
+    ('height', '<u2'),
+    ('lane', 'u1')
+])
+
+
+def lane_of(box, frame_width=FRAME_WIDTH, lanes=LANE_COUNT):
+    x, y, w, h = box
+    return min(lanes - 1, max(0, int((x + w / 2) / frame_width * lanes)))
+
+
+class CrossingLog:
+    """Append-only binary log of line crossings, read back memory-mapped.
+
+    Records are written in batches and kept in time order, so the timestamp
+    column doubles as the time index: a range query is two binary searches
+    over the mapped file, however long the history is.
+    """
+
+    def __init__(self, path, batch_size=EVENT_LOG_BATCH, flush_interval=EVENT_LOG_FLUSH_SECONDS):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._last_flush = time.time()
+        self._last_timestamp = None
+        self._lock = threading.Lock()
+
+        # Continue from the last stored record
+        events = self._map()
+        if len(events):
+            self._last_timestamp = float(events['timestamp'][-1])
+
+    def append(self, crossings, time_offset=0.0):
+        with self._lock:
+            for crossing in crossings:
+                # Keep the file sorted even if a clock steps backwards
+                timestamp = crossing['timestamp'] + time_offset
+                if self._last_timestamp is not None and timestamp < self._last_timestamp:
+                    timestamp = self._last_timestamp
+                self._last_timestamp = timestamp
+
+                x, y, w, h = crossing['box']
+                self._pending.append((
+                    timestamp, crossing['track_id'], crossing['speed'],
+                    w, h, lane_of(crossing['box'])
+                ))
+
+            if (len(self._pending) >= self.batch_size or
+                    time.time() - self._last_flush >= self.flush_interval):
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        self._last_flush = time.time()
+        if not self._pending:
+            return
+        records = np.array(self._pending, dtype=EVENT_DTYPE)
+        # The directory is only created once there is something to write
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'ab') as f:
+            f.write(records.tobytes())
+        self._pending = []
+
+    def _map(self):
+        if not os.path.exists(self.path):
+            return np.zeros(0, dtype=EVENT_DTYPE)
+        # Ignore a partly written trailing record
+        count = os.path.getsize(self.path) // EVENT_DTYPE.itemsize
+        if count == 0:
+            return np.zeros(0, dtype=EVENT_DTYPE)
+        return np.memmap(self.path, dtype=EVENT_DTYPE, mode='r', shape=(count,))
+
+    def query(self, start, end):
+        """Records with start <= timestamp < end."""
+        self.flush()
+        events = self._map()
+        timestamps = events['timestamp']
+        first = np.searchsorted(timestamps, start, side='left')
+        last = np.searchsorted(timestamps, end, side='left')
+        return np.array(events[first:last])
+
+    def summary(self, start, end, bucket, speed_bins=SPEED_HISTOGRAM_BINS):
+        """Counts, mean speed and a speed histogram per time bucket."""
+        events = self.query(start, end)
+        n_buckets = max(1, int(np.ceil((end - start) / bucket)))
+        edges = start + np.arange(n_buckets + 1) * bucket
+        speed_edges = np.asarray(speed_bins, dtype=np.float64)
+
+        index = ((events['timestamp'] - start) // bucket).astype(np.int64)
+        counts = np.bincount(index, minlength=n_buckets)[:n_buckets]
+        speed_sums = np.bincount(index, weights=events['speed'], minlength=n_buckets)[:n_buckets]
+        histograms, _, _ = np.histogram2d(
+            events['timestamp'], events['speed'], bins=(edges, speed_edges)
+        )
+
+        buckets = []
+        for i in range(n_buckets):
+            buckets.append({
+                'start': float(edges[i]),
+                'count': int(counts[i]),
+                'average_speed': round(float(speed_sums[i] / counts[i]), 2) if counts[i] else 0,
+                'speed_histogram': histograms[i].astype(int).tolist()
+            })
+        return {
+            'start': start,
+            'end': end,
+            'bucket': bucket,
+            'total_count': int(counts.sum()),
+            'speed_bins': speed_edges.tolist(),
+            'buckets': buckets
+        }
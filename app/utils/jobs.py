@@ -0,0 +1,171 @@
+import multiprocessing as mp
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+from werkzeug.utils import secure_filename
+from .constants import *  # Import constants
+from .detection_cache import DetectionCache
+from .video_analysis import analyze_video
+
+
+def save_upload(stream, filename, folder=UPLOAD_DIR, chunk_size=UPLOAD_CHUNK_SIZE):
+    """Copy an upload to a new unique path in fixed-size chunks; returns the path."""
+    extension = os.path.splitext(secure_filename(filename or ''))[1].lower()
+    if extension not in VIDEO_EXTENSIONS:
+        extension = '.mp4'
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{uuid.uuid4().hex}{extension}")
+
+    with open(path, 'wb') as f:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            f.write(chunk)
+    return path
+
+
+# Set in each worker process by init_job_worker
+_progress_queue = None
+
+
+def init_job_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+    # Jobs share the machine with live streams; keep OpenCV to one thread
+    # and let the live camera win when cores are contended
+    cv2.setNumThreads(1)
+    if hasattr(os, 'nice'):
+        os.nice(JOB_NICENESS)
+
+
+def run_job(job_id, path):
+    last_sent = [0.0]
+
+    def progress(frames_done, frames_total):
+        now = time.time()
+        if now - last_sent[0] >= JOB_PROGRESS_INTERVAL or frames_done == frames_total:
+            _progress_queue.put((job_id, frames_done, frames_total, now))
+            last_sent[0] = now
+
+    _progress_queue.put((job_id, 0, 0, time.time()))
+    return analyze_video(path, progress=progress, cache=DetectionCache())
+
+
+class Job:
+    def __init__(self, job_id, filename, path):
+        self.id = job_id
+        self.filename = filename
+        self.path = path
+        self.status = 'queued'
+        self.frames_done = 0
+        self.frames_total = 0
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.result = None
+
+    def describe(self):
+        end = self.finished or time.time()
+        elapsed = end - self.started if self.started else 0
+        fps = self.frames_done / elapsed if elapsed > 0 else 0
+        remaining = max(0, self.frames_total - self.frames_done)
+        eta = remaining / fps if fps > 0 and self.status == 'running' and self.frames_total else None
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'frames_done': self.frames_done,
+            'frames_total': self.frames_total,
+            'progress': round(self.frames_done / self.frames_total, 4) if self.frames_total else 0,
+            'fps': round(fps, 1),
+            'eta_seconds': round(eta, 1) if eta is not None else None,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'error': self.error
+        }
+
+
+class JobQueue:
+    """Uploaded videos analysed in the background by a pool of worker processes.
+
+    Workers decode and detect as fast as they can, with no real-time
+    pacing, and report progress back through a queue that a monitor thread
+    folds into the job table. The pool is started on the first job.
+    """
+
+    def __init__(self, workers=JOB_WORKERS):
+        self.workers = workers
+        self._ctx = mp.get_context('spawn')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._progress = None
+
+    def _start(self):
+        self._progress = self._ctx.Queue()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=self._ctx,
+            initializer=init_job_worker,
+            initargs=(self._progress,)
+        )
+        threading.Thread(target=self._monitor, daemon=True).start()
+
+    def submit(self, filename, path):
+        job = Job(uuid.uuid4().hex[:12], filename, path)
+        with self._lock:
+            if self._executor is None:
+                self._start()
+            self._jobs[job.id] = job
+            future = self._executor.submit(run_job, job.id, path)
+        future.add_done_callback(lambda f: self._finish(job, f))
+        return job
+
+    def _monitor(self):
+        while True:
+            job_id, frames_done, frames_total, timestamp = self._progress.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job.status not in ('queued', 'running'):
+                    continue
+                if job.status == 'queued':
+                    job.status = 'running'
+                    job.started = timestamp
+                job.frames_done = frames_done
+                job.frames_total = frames_total
+
+    def _finish(self, job, future):
+        with self._lock:
+            job.finished = time.time()
+            try:
+                job.result = future.result()
+                job.status = 'done'
+                job.frames_done = job.result['frames']
+                job.frames_total = max(job.frames_total, job.frames_done)
+            except Exception as e:
+                job.status = 'failed'
+                job.error = str(e)
+            if job.started is None:
+                job.started = job.finished
+
+        # The results are kept; the uploaded video is no longer needed
+        try:
+            os.remove(job.path)
+        except OSError:
+            pass
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def list(self):
+        return list(self._jobs.values())
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,148 @@
+import threading
+import time
+import numpy as np
+from .constants import *  # Import constants
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyHistogram:
+    """Rolling window of the most recent latency samples in a ring buffer."""
+
+    def __init__(self, size=METRICS_WINDOW):
+        self.samples = np.zeros(size, dtype=np.float64)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.samples[self.count % len(self.samples)] = seconds
+            self.count += 1
+
+    def quantiles(self, quantiles=QUANTILES):
+        with self._lock:
+            window = self.samples[:min(self.count, len(self.samples))].copy()
+        if len(window) == 0:
+            return [0.0] * len(quantiles)
+        return np.quantile(window, quantiles).tolist()
+
+
+class StageTimer:
+    """Context manager timing one stage; each stage is timed from one thread."""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.add(time.perf_counter() - self.started)
+        return False
+
+
+class Metrics:
+    """Per-stream stage latencies, counters and gauges."""
+
+    enabled = True
+
+    def __init__(self):
+        self.stages = {}
+        self.gauges = {}
+        self._timers = {}
+
+    def _histogram(self, stage):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages.setdefault(stage, LatencyHistogram())
+        return histogram
+
+    def time(self, stage):
+        timer = self._timers.get(stage)
+        if timer is None:
+            timer = self._timers.setdefault(stage, StageTimer(self._histogram(stage)))
+        return timer
+
+    def observe(self, stage, seconds):
+        self._histogram(stage).add(seconds)
+
+    def set(self, name, value):
+        self.gauges[name] = value
+
+    def snapshot(self):
+        stages = {}
+        for stage, histogram in list(self.stages.items()):
+            stages[stage] = dict(zip(('p50', 'p95', 'p99'), histogram.quantiles()))
+            stages[stage]['count'] = histogram.count
+        return {'stages': stages, 'gauges': dict(self.gauges)}
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class NullMetrics:
+    """Stand-in used when instrumentation is switched off."""
+
+    enabled = False
+    _timer = _NullTimer()
+
+    def time(self, stage):
+        return self._timer
+
+    def observe(self, stage, seconds):
+        pass
+
+    def set(self, name, value):
+        pass
+
+    def snapshot(self):
+        return {'stages': {}, 'gauges': {}}
+
+
+NULL_METRICS = NullMetrics()
+
+
+def create_metrics():
+    return Metrics() if ENABLE_METRICS else NULL_METRICS
+
+
+def render_prometheus(snapshots):
+    """Prometheus text exposition for a {stream name: snapshot} mapping."""
+    lines = [
+        '# HELP vehicle_stage_latency_seconds Processing time per pipeline stage',
+        '# TYPE vehicle_stage_latency_seconds summary'
+    ]
+    for stream, snapshot in snapshots.items():
+        for stage, values in snapshot['stages'].items():
+            for quantile, key in zip(QUANTILES, ('p50', 'p95', 'p99')):
+                lines.append(
+                    f'vehicle_stage_latency_seconds{{stream="{stream}",stage="{stage}",'
+                    f'quantile="{quantile}"}} {values[key]:.6f}'
+                )
+            lines.append(
+                f'vehicle_stage_latency_seconds_count{{stream="{stream}",stage="{stage}"}} '
+                f'{values["count"]}'
+            )
+
+    gauges = (
+        ('processed_fps', 'gauge', 'Frames run through detection per second'),
+        ('dropped_frames', 'counter', 'Frames dropped by load shedding'),
+        ('active_tracks', 'gauge', 'Vehicles currently tracked'),
+        ('frame_skip', 'gauge', 'Frames per full detection')
+    )
+    for name, kind, description in gauges:
+        metric = f'vehicle_{name}_total' if kind == 'counter' else f'vehicle_{name}'
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} {kind}')
+        for stream, snapshot in snapshots.items():
+            if name in snapshot['gauges']:
+                lines.append(f'{metric}{{stream="{stream}"}} {snapshot["gauges"][name]}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,51 @@
+import cv2
+import numpy as np
+from .metrics import NULL_METRICS
+
+
+class FramePreprocessor:
+    """Turns a frame region into a cleaned foreground mask using reusable buffers.
+
+    Every step writes into arrays owned by the preprocessor through OpenCV's
+    dst arguments, so steady-state frames allocate no new images. Buffers and
+    the structuring element are rebuilt only when the processed size or the
+    kernel size changes.
+    """
+
+    def __init__(self):
+        self._key = None
+
+    def _allocate(self, width, height, ksize):
+        self.scaled = np.empty((height, width, 3), dtype=np.uint8)
+        self.gray = np.empty((height, width), dtype=np.uint8)
+        self.blur = np.empty((height, width), dtype=np.uint8)
+        self.fg_mask = np.empty((height, width), dtype=np.uint8)
+        self.opened = np.empty((height, width), dtype=np.uint8)
+        self.closed = np.empty((height, width), dtype=np.uint8)
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (ksize, ksize))
+        self._key = (width, height, ksize)
+
+    def process(self, region, size, bg_subtractor, ksize, roi_mask=None, metrics=NULL_METRICS):
+        width, height = size
+        if self._key != (width, height, ksize):
+            self._allocate(width, height, ksize)
+
+        with metrics.time('blur'):
+            if region.shape[1] != width or region.shape[0] != height:
+                cv2.resize(region, size, dst=self.scaled, interpolation=cv2.INTER_AREA)
+                region = self.scaled
+
+            cv2.cvtColor(region, cv2.COLOR_BGR2GRAY, dst=self.gray)
+            cv2.GaussianBlur(self.gray, (ksize, ksize), 0, dst=self.blur)
+
+        # Apply background subtraction
+        with metrics.time('mog2'):
+            bg_subtractor.apply(self.blur, fgmask=self.fg_mask)
+            if roi_mask is not None:
+                cv2.bitwise_and(self.fg_mask, roi_mask, dst=self.fg_mask)
+
+        # Clean up mask
+        with metrics.time('morphology'):
+            cv2.morphologyEx(self.fg_mask, cv2.MORPH_OPEN, self.kernel, dst=self.opened)
+            cv2.morphologyEx(self.opened, cv2.MORPH_CLOSE, self.kernel, dst=self.closed)
+        return self.closed
@@ -0,0 +1,146 @@
+import os
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+from .constants import *  # Import constants
+from .video_stream import draw_annotations
+
+
+class VideoRecorder:
+    """Writes annotated frames of a stream to a series of video files.
+
+    The detector thread hands over each frame with the boxes it already
+    found; drawing and writing happen on the recorder's own thread. Frames
+    are copied into a fixed pool of buffers, so when the writer falls
+    behind and every buffer is in use the frame is dropped rather than
+    holding up detection. Frames are placed by their capture timestamps:
+    the previous frame is repeated over gaps, such as frames shed before
+    detection, and frames arriving faster than fps are skipped, so files
+    play back in real time. A new segment file is started once the current
+    one spans segment_seconds of capture time or reaches segment_bytes.
+    """
+
+    def __init__(self, directory=RECORD_DIR, prefix='main', fps=FPS,
+                 segment_seconds=RECORD_SEGMENT_SECONDS,
+                 segment_bytes=RECORD_SEGMENT_BYTES,
+                 queue_size=RECORD_QUEUE_SIZE, codec=RECORD_CODEC):
+        self.directory = directory
+        self.prefix = prefix
+        self.fps = fps
+        self.segment_seconds = segment_seconds
+        self.segment_bytes = segment_bytes
+        self.codec = codec
+        self.queue_size = queue_size
+
+        self.segments = []  # Paths of every file written so far
+        self.recorded_frames = 0
+        self.dropped_frames = 0
+
+        self._queue = queue.Queue()
+        self._free = queue.Queue()  # Buffers ready to take a frame
+        self._buffers = 0
+        self._writer = None
+        self._segment_start = 0.0  # Capture time of the first frame in the segment
+        self._segment_frames = 0
+        self._next_size_check = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, frame, timestamp, boxes, line_y=None, labels=None):
+        """Queue a copy of a frame for writing; returns False if it was dropped."""
+        try:
+            buffer = self._free.get_nowait()
+        except queue.Empty:
+            if self._buffers >= self.queue_size:
+                self.dropped_frames += 1
+                return False
+            buffer = np.empty_like(frame)
+            self._buffers += 1
+        if buffer.shape != frame.shape:
+            buffer = np.empty_like(frame)
+        np.copyto(buffer, frame)
+        self._queue.put((buffer, timestamp, [list(box) for box in boxes], line_y, labels))
+        return True
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            frame, timestamp, boxes, line_y, labels = item
+            try:
+                self._write(frame, timestamp, boxes, line_y, labels)
+            except Exception as e:
+                print(f"Error recording frame: {str(e)}")
+            self._free.put(frame)
+        self._close_segment()
+
+    def _write(self, frame, timestamp, boxes, line_y, labels):
+        draw_annotations(frame, boxes, line_y, labels)
+
+        # Start a new segment when this one is full, or when the clock went
+        # backwards because a new source began
+        if self._writer is not None and (timestamp < self._segment_start or
+                                         self._segment_full(timestamp)):
+            self._close_segment()
+        if self._writer is None:
+            self._open_segment(frame.shape[1], frame.shape[0])
+            self._segment_start = timestamp
+
+        # Frames this one covers up to its capture time
+        due = int((timestamp - self._segment_start) * self.fps) + 1 - self._segment_frames
+        if due > self.fps:
+            # A stall of over a second; pick up from here instead of filling it
+            self._segment_start += (due - 1) / self.fps
+            due = 1
+        for _ in range(due):
+            self._writer.write(frame)
+        self._segment_frames += max(0, due)
+        self.recorded_frames += max(0, due)
+
+    def _segment_full(self, timestamp):
+        if timestamp - self._segment_start >= self.segment_seconds:
+            return True
+        # The file only grows in bursts as the writer flushes; a stat per
+        # second of video is enough
+        if self._segment_frames >= self._next_size_check:
+            self._next_size_check = self._segment_frames + max(1, int(self.fps))
+            try:
+                return os.path.getsize(self.segments[-1]) >= self.segment_bytes
+            except OSError:
+                return False
+        return False
+
+    def _open_segment(self, width, height):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(self.directory,
+                            f"{self.prefix}-{stamp}-{len(self.segments):04d}{RECORD_EXTENSION}")
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*self.codec), self.fps,
+                                 (width, height))
+        if not writer.isOpened():
+            raise IOError(f"Could not open video writer: {path}")
+        self._writer = writer
+        self._segment_frames = 0
+        self._next_size_check = 0
+        self.segments.append(path)
+
+    def _close_segment(self):
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+
+    def describe(self):
+        return {
+            'recording': self._thread.is_alive(),
+            'segments': list(self.segments),
+            'recorded_frames': self.recorded_frames,
+            'dropped_frames': self.dropped_frames
+        }
+
+    def stop(self):
+        """Write the frames already queued, then close the current segment."""
+        self._queue.put(None)
+        self._thread.join()
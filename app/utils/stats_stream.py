@@ -0,0 +1,68 @@
+import json
+import threading
+import time
+from collections import deque
+from .constants import *  # Import constants
+
+
+class StatsBroadcaster:
+    """One server-sent event source for stats, shared by every dashboard.
+
+    The detector publishes after every frame. Updates are coalesced into at
+    most `rate` messages per second: the latest count and speed win, while
+    crossings are accumulated so none are lost between messages. Recent
+    messages are kept so a client that falls behind still receives every
+    crossing.
+    """
+
+    def __init__(self, rate=STATS_STREAM_RATE, backlog=64):
+        self.rate = rate
+        self._condition = threading.Condition()
+        self._pending = None
+        self._pending_crossings = []
+        self._messages = deque(maxlen=backlog)
+        self._message_id = 0
+        self._thread = None
+
+    def publish(self, stats, crossings=()):
+        with self._condition:
+            self._pending = stats
+            self._pending_crossings.extend(crossings)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending is not None)
+                message = dict(self._pending, crossings=self._pending_crossings)
+                self._pending = None
+                self._pending_crossings = []
+
+                self._message_id += 1
+                self._messages.append((self._message_id, json.dumps(message)))
+                self._condition.notify_all()
+
+            # Coalesce whatever arrives until the next slot
+            time.sleep(1 / self.rate)
+
+    def events(self):
+        """Yield server-sent events, starting with the newest message."""
+        with self._condition:
+            last_id = self._messages[-1][0] - 1 if self._messages else 0
+
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._message_id > last_id, timeout=15)
+                batch = [(mid, payload) for mid, payload in self._messages if mid > last_id]
+
+            # Keep idle connections open through proxies
+            if not batch:
+                yield ': keepalive\n\n'
+                continue
+
+            for mid, payload in batch:
+                yield f'id: {mid}\ndata: {payload}\n\n'
+            last_id = batch[-1][0]
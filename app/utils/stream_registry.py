@@ -0,0 +1,248 @@
+import json
+import multiprocessing as mp
+import os
+import re
+import threading
+import time
+from multiprocessing import shared_memory
+import cv2
+from .constants import *  # Import constants
+from .event_log import CrossingLog
+from .vehicle_detection import VehicleDetector
+from .video_stream import VideoStream
+
+STATS_FIELDS = ('vehicle_count', 'average_speed', 'active_tracks', 'frames', 'running')
+MAX_FRAME_BYTES = FRAME_WIDTH * FRAME_HEIGHT * 3  # An encoded frame never exceeds the raw one
+MAX_METRICS_BYTES = 16384
+
+
+def is_valid_stream_id(stream_id):
+    # Stream ids name files on disk, so keep them to plain names
+    return bool(re.fullmatch(r'[A-Za-z0-9_-]{1,64}', stream_id or ''))
+
+
+def open_source(source):
+    """Open a camera index, video file or stream URL; returns (capture, is_video)."""
+    source = str(source)
+    is_video = os.path.isfile(source)
+    cap = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    if cap.isOpened() and source.isdigit():
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap, is_video
+
+
+class StreamChannel:
+    """Latest encoded frame and stats of one stream, shared between processes.
+
+    The worker writes each JPEG into a shared memory block; the web process
+    copies it out once per new frame, however many clients are watching.
+    """
+
+    def __init__(self, ctx):
+        self.shm = shared_memory.SharedMemory(create=True, size=MAX_FRAME_BYTES)
+        self.lock = ctx.Lock()
+        self.frame_id = ctx.Value('Q', 0, lock=False)
+        self.frame_size = ctx.Value('I', 0, lock=False)
+        self.stats = ctx.Array('d', len(STATS_FIELDS), lock=False)
+        self.metrics = ctx.Array('c', MAX_METRICS_BYTES, lock=False)
+        self.viewers = ctx.Value('i', 0)
+        self.stop_event = ctx.Event()
+        self._latest = (0, None)
+
+    def write_frame(self, frame_bytes):
+        size = len(frame_bytes)
+        if size > self.shm.size:
+            return
+        with self.lock:
+            self.shm.buf[:size] = frame_bytes
+            self.frame_size.value = size
+            self.frame_id.value += 1
+
+    def read_frame(self):
+        """Newest frame as (frame_id, bytes)."""
+        if self.frame_id.value != self._latest[0]:
+            with self.lock:
+                self._latest = (self.frame_id.value, bytes(self.shm.buf[:self.frame_size.value]))
+        return self._latest
+
+    def write_stats(self, **values):
+        with self.lock:
+            for name, value in values.items():
+                self.stats[STATS_FIELDS.index(name)] = value
+
+    def read_stats(self):
+        with self.lock:
+            return dict(zip(STATS_FIELDS, self.stats[:]))
+
+    def write_metrics(self, snapshot):
+        data = json.dumps(snapshot).encode()
+        if len(data) < MAX_METRICS_BYTES:
+            with self.lock:
+                self.metrics.value = data
+
+    def read_metrics(self):
+        with self.lock:
+            data = self.metrics.value
+        return json.loads(data) if data else {'stages': {}, 'gauges': {}}
+
+    def close(self):
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SharedMemoryStream(VideoStream):
+    """VideoStream running in a worker process and publishing through a StreamChannel."""
+
+    def __init__(self, detector, capture, is_video, channel, event_log=None):
+        super().__init__(detector, capture, is_video, event_log=event_log)
+        self.channel = channel
+        self.frames_processed = 0
+        self._metrics_written = 0.0
+
+    def has_viewers(self):
+        return self.channel.viewers.value > 0
+
+    def on_detection(self, timestamp):
+        super().on_detection(timestamp)
+        detector = self.detector
+        speeds = detector.current_speeds
+        self.frames_processed += 1
+        self.channel.write_stats(
+            vehicle_count=detector.vehicle_count,
+            average_speed=sum(speeds) / len(speeds) if speeds else detector.last_avg_speed,
+            active_tracks=len(detector.tracks),
+            frames=self.frames_processed
+        )
+
+        # Percentiles are only worth shipping to the web process once a second
+        if self.metrics.enabled and time.time() - self._metrics_written >= 1.0:
+            self.channel.write_metrics(self.metrics.snapshot())
+            self._metrics_written = time.time()
+
+    def _publish(self, frame_bytes):
+        self.channel.write_frame(frame_bytes)
+
+
+def run_stream_worker(stream_id, source, channel):
+    # Each stream has a process to itself; keep OpenCV to one thread per stage
+    cv2.setNumThreads(1)
+
+    capture, is_video = open_source(source)
+    if not capture.isOpened():
+        print(f"Error opening stream source: {source}")
+        return
+
+    event_log = CrossingLog(os.path.join(EVENT_LOG_DIR, f"{stream_id}.bin"))
+    stream = SharedMemoryStream(VehicleDetector(stream_id), capture, is_video, channel, event_log)
+    channel.write_stats(running=1)
+    stream.start()
+    try:
+        while stream.is_running and not channel.stop_event.wait(0.5):
+            pass
+    finally:
+        stream.stop()
+        channel.write_stats(running=0)
+
+
+class StreamHandle:
+    """Web-process side of a stream running in its own worker process."""
+
+    def __init__(self, stream_id, source, process, channel):
+        self.stream_id = stream_id
+        self.source = source
+        self.process = process
+        self.channel = channel
+
+    @property
+    def is_running(self):
+        return self.process.is_alive()
+
+    def stats(self):
+        stats = self.channel.read_stats()
+        stats['running'] = bool(stats['running']) and self.is_running
+        stats['vehicle_count'] = int(stats['vehicle_count'])
+        stats['average_speed'] = round(stats['average_speed'], 2)
+        stats['active_tracks'] = int(stats['active_tracks'])
+        stats['frames'] = int(stats['frames'])
+        return stats
+
+    def metrics(self):
+        return self.channel.read_metrics()
+
+    def describe(self):
+        return dict(self.stats(), id=self.stream_id, source=str(self.source))
+
+    def frames(self):
+        """Yield MJPEG parts with the newest frame of the stream."""
+        with self.channel.viewers.get_lock():
+            self.channel.viewers.value += 1
+        last_id = 0
+
+        try:
+            while self.is_running:
+                frame_id, frame_bytes = self.channel.read_frame()
+                if frame_id == last_id or frame_bytes is None:
+                    time.sleep(0.01)
+                    continue
+                last_id = frame_id
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        finally:
+            with self.channel.viewers.get_lock():
+                self.channel.viewers.value -= 1
+
+
+class StreamRegistry:
+    """Named streams, each with its own VehicleDetector in a worker process."""
+
+    def __init__(self):
+        self._ctx = mp.get_context('spawn')
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def add(self, stream_id, source):
+        with self._lock:
+            if not is_valid_stream_id(stream_id):
+                raise ValueError('Stream ids may only contain letters, digits, - and _')
+            if stream_id in self._streams:
+                raise ValueError(f"Stream '{stream_id}' already exists")
+
+            channel = StreamChannel(self._ctx)
+            process = self._ctx.Process(
+                target=run_stream_worker,
+                args=(stream_id, source, channel),
+                name=f"stream-{stream_id}",
+                daemon=True
+            )
+            process.start()
+            handle = StreamHandle(stream_id, source, process, channel)
+            self._streams[stream_id] = handle
+            return handle
+
+    def remove(self, stream_id):
+        with self._lock:
+            handle = self._streams.pop(stream_id, None)
+        if handle is None:
+            return False
+
+        handle.channel.stop_event.set()
+        handle.process.join(timeout=5)
+        if handle.process.is_alive():
+            handle.process.terminate()
+        handle.channel.close()
+        return True
+
+    def get(self, stream_id):
+        return self._streams.get(stream_id)
+
+    def list(self):
+        return list(self._streams.values())
+
+    def stop_all(self):
+        for stream_id in list(self._streams):
+            self.remove(stream_id)
@@ -0,0 +1,185 @@
+import threading
+import numpy as np
+from .constants import *  # Import constants
+
+MAX_SAMPLE_GAP = 1.0  # Longer gaps between detections count as unobserved time
+EMPTY = np.iinfo(np.int64).min  # Bucket index of a slot holding no data
+
+
+class SeriesLevel:
+    """Fixed-size ring of time buckets at one resolution.
+
+    Slot i holds bucket index `bucket[i]`; a slot is cleared when a newer
+    bucket lands on it, so old data falls off without a separate pass.
+    """
+
+    def __init__(self, resolution, size, speed_bins):
+        self.resolution = resolution
+        self.size = size
+        self.bucket = np.full(size, EMPTY, dtype=np.int64)
+        self.count = np.zeros(size, dtype=np.uint32)
+        self.speed_count = np.zeros(size, dtype=np.uint32)
+        self.speed_sum = np.zeros(size, dtype=np.float64)
+        self.occupied = np.zeros(size, dtype=np.float64)
+        self.observed = np.zeros(size, dtype=np.float64)
+        self.histogram = np.zeros((size, speed_bins), dtype=np.uint32)
+
+    @property
+    def span(self):
+        return self.resolution * self.size
+
+    def clear(self):
+        self.bucket[:] = EMPTY
+
+    def _slot(self, timestamp):
+        index = int(timestamp // self.resolution)
+        slot = index % self.size
+        if self.bucket[slot] != index:
+            self.bucket[slot] = index
+            self.count[slot] = 0
+            self.speed_count[slot] = 0
+            self.speed_sum[slot] = 0
+            self.occupied[slot] = 0
+            self.observed[slot] = 0
+            self.histogram[slot] = 0
+        return slot
+
+    def add(self, timestamp, speed_bins, speeds, crossings, occupied, observed):
+        slot = self._slot(timestamp)
+        self.count[slot] += crossings
+        self.occupied[slot] += occupied
+        self.observed[slot] += observed
+        if len(speeds):
+            self.speed_count[slot] += len(speeds)
+            self.speed_sum[slot] += float(np.sum(speeds))
+            np.add.at(self.histogram[slot], speed_bins, 1)
+
+    def buckets(self, start, end):
+        """Slots of the buckets overlapping [start, end], oldest first, and a validity mask."""
+        first = int(start // self.resolution)
+        last = int(end // self.resolution) + 1
+        indices = np.arange(max(first, last - self.size), last)
+        slots = indices % self.size
+        return slots, self.bucket[slots] == indices
+
+
+class TrafficHistory:
+    """Rolling traffic statistics kept at several resolutions at once.
+
+    Every detection is added to one bucket per level, so the coarse levels
+    are downsampled as data arrives rather than rebuilt from raw samples.
+    Buckets keep sums and a speed histogram, which makes any window a sum
+    over at most one level's worth of buckets: flow, mean and 85th
+    percentile speed and detection line occupancy come out in O(buckets).
+    """
+
+    def __init__(self, levels=TIME_SERIES_LEVELS, speed_step=TIME_SERIES_SPEED_STEP):
+        self.speed_step = speed_step
+        self.speed_edges = np.arange(0, MAX_SPEED + speed_step, speed_step, dtype=np.float64)
+        self.levels = [
+            SeriesLevel(resolution, size, len(self.speed_edges))
+            for resolution, size in sorted(levels)
+        ]
+        self.latest = None
+        self._lock = threading.Lock()
+
+    def record(self, timestamp, speeds=(), occupied=False):
+        """Add one detection: speeds of the vehicles that crossed and whether the line was covered."""
+        with self._lock:
+            if self.latest is not None and timestamp < self.latest:
+                # A new video restarts its clock; start a fresh history
+                for level in self.levels:
+                    level.clear()
+                self.latest = None
+
+            gap = timestamp - self.latest if self.latest is not None else 0.0
+            observed = gap if gap <= MAX_SAMPLE_GAP else 0.0
+            self.latest = timestamp
+
+            # Crossings whose speed is not known yet still count towards flow
+            measured = np.asarray([s for s in speeds if s > 0], dtype=np.float64)
+            speed_bins = np.minimum(
+                (measured // self.speed_step).astype(np.int64), len(self.speed_edges) - 1
+            )
+            for level in self.levels:
+                level.add(timestamp, speed_bins, measured, len(speeds),
+                          observed if occupied else 0.0, observed)
+
+    def _level_for(self, seconds):
+        # Finest level that still covers the whole window
+        for level in self.levels:
+            if level.span >= seconds:
+                return level
+        return self.levels[-1]
+
+    def _summarize(self, count, speed_count, speed_sum, occupied, observed, histogram):
+        p85 = 0.0
+        if speed_count:
+            cumulative = np.cumsum(histogram)
+            target = 0.85 * speed_count
+            i = int(np.searchsorted(cumulative, target))
+            before = cumulative[i - 1] if i else 0
+            # Interpolate within the histogram bin
+            p85 = self.speed_edges[i] + (target - before) / histogram[i] * self.speed_step
+            p85 = min(p85, MAX_SPEED)
+        return {
+            'count': int(count),
+            'flow_per_hour': round(float(count * 3600 / observed), 1) if observed else 0,
+            'average_speed': round(float(speed_sum / speed_count), 2) if speed_count else 0,
+            'p85_speed': round(float(p85), 2),
+            'occupancy': round(float(occupied / observed), 4) if observed else 0
+        }
+
+    def window(self, seconds, end=None):
+        """Summary of the last `seconds` up to `end` (default: the latest detection)."""
+        with self._lock:
+            if self.latest is None:
+                return dict(self._summarize(0, 0, 0, 0, 0, None), window=seconds, resolution=0)
+            end = self.latest if end is None else end
+            level = self._level_for(seconds)
+            slots, valid = level.buckets(end - seconds, end)
+            slots = slots[valid]
+            summary = self._summarize(
+                level.count[slots].sum(),
+                level.speed_count[slots].sum(),
+                level.speed_sum[slots].sum(),
+                level.occupied[slots].sum(),
+                level.observed[slots].sum(),
+                level.histogram[slots].sum(axis=0)
+            )
+        return dict(summary, window=seconds, resolution=level.resolution)
+
+    def series(self, seconds, points=MAX_STATS_HISTORY, end=None):
+        """The last `seconds` split into at most `points` consecutive summaries."""
+        with self._lock:
+            if self.latest is None:
+                return {'window': seconds, 'resolution': 0, 'points': []}
+            end = self.latest if end is None else end
+            level = self._level_for(seconds)
+            slots, valid = level.buckets(end - seconds, end)
+            first_bucket = int(end // level.resolution) + 1 - len(slots)
+
+            # Group consecutive buckets so no more than `points` come back
+            per_point = max(1, int(np.ceil(len(slots) / points)))
+            starts = np.arange(0, len(slots), per_point)
+
+            def grouped(values):
+                rows = values[slots].astype(np.float64)
+                rows[~valid] = 0
+                return np.add.reduceat(rows, starts, axis=0)
+
+            columns = (
+                grouped(level.count),
+                grouped(level.speed_count),
+                grouped(level.speed_sum),
+                grouped(level.occupied),
+                grouped(level.observed),
+                grouped(level.histogram)
+            )
+
+        result = []
+        for n, start in enumerate(starts):
+            point = self._summarize(*(column[n] for column in columns))
+            point['timestamp'] = float((first_bucket + start) * level.resolution)
+            result.append(point)
+        return {'window': seconds, 'resolution': level.resolution * per_point, 'points': result}
@@ -0,0 +1,251 @@
+import numpy as np
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """IoU of every [x, y, w, h] box in boxes_a against every box in boxes_b."""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+    ax1, ay1 = a[:, 0:1], a[:, 1:2]
+    ax2, ay2 = ax1 + a[:, 2:3], ay1 + a[:, 3:4]
+    bx1, by1 = b[:, 0], b[:, 1]
+    bx2, by2 = bx1 + b[:, 2], by1 + b[:, 3]
+
+    inter_w = np.clip(np.minimum(ax2, bx2) - np.maximum(ax1, bx1), 0, None)
+    inter_h = np.clip(np.minimum(ay2, by2) - np.maximum(ay1, by1), 0, None)
+    inter_area = inter_w * inter_h
+
+    union = a[:, 2:3] * a[:, 3:4] + b[:, 2] * b[:, 3] - inter_area
+    return inter_area / np.maximum(union, 1e-9)
+
+
+def linear_assignment(cost):
+    """Minimum-cost assignment of rows to columns (Hungarian method).
+
+    Returns (rows, cols) index arrays; every row is assigned when there are
+    at least as many columns as rows, and vice versa.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+
+    n, m = cost.shape
+    if n == 0:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty
+
+    # Potentials and column owners, 1-indexed with column 0 as a sentinel
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    owner = np.zeros(m + 1, dtype=np.intp)
+    way = np.zeros(m + 1, dtype=np.intp)
+
+    for i in range(1, n + 1):
+        owner[0] = i
+        j0 = 0
+        min_v = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+
+        # Grow an alternating path until it reaches a free column
+        while True:
+            used[j0] = True
+            i0 = owner[j0]
+            free = ~used[1:]
+
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < min_v[1:])
+            min_v[1:][better] = reduced[better]
+            way[1:][better] = j0
+
+            candidates = np.where(free, min_v[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+
+            u[owner[used]] += delta
+            v[used] -= delta
+            min_v[~used] -= delta
+
+            j0 = j1
+            if owner[j0] == 0:
+                break
+
+        # Flip the path
+        while j0:
+            j1 = way[j0]
+            owner[j0] = owner[j1]
+            j0 = j1
+
+    cols = np.nonzero(owner[1:])[0]
+    rows = owner[cols + 1] - 1
+    if transposed:
+        rows, cols = cols, rows
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+
+def match_boxes(detections, tracks, iou_threshold):
+    """Globally match detections to tracks by IoU.
+
+    Returns (matches, unmatched_detections, unmatched_tracks) where matches
+    is a list of (detection index, track index) pairs.
+    """
+    n_det, n_trk = len(detections), len(tracks)
+    if n_det == 0 or n_trk == 0:
+        return [], list(range(n_det)), list(range(n_trk))
+
+    iou = iou_matrix(detections, tracks)
+
+    # Pairs below the threshold are worth nothing, so they never win a match
+    cost = np.where(iou > iou_threshold, -iou, 0.0)
+    rows, cols = linear_assignment(cost)
+    valid = iou[rows, cols] > iou_threshold
+    matches = list(zip(rows[valid].tolist(), cols[valid].tolist()))
+
+    matched_det = set(rows[valid].tolist())
+    matched_trk = set(cols[valid].tolist())
+    unmatched_det = [i for i in range(n_det) if i not in matched_det]
+    unmatched_trk = [j for j in range(n_trk) if j not in matched_trk]
+    return matches, unmatched_det, unmatched_trk
+
+
+class TrackStore:
+    """Tracked vehicles kept in preallocated arrays, one row per slot.
+
+    Centroids and speeds live in fixed-size ring buffers, so the memory used
+    by a track never grows with its age.
+    """
+
+    def __init__(self, capacity=64, positions_history=10, speed_history=5):
+        self.positions_history = positions_history
+        self.speed_history = speed_history
+        self._next_id = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.active = np.zeros(capacity, dtype=bool)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.boxes = np.zeros((capacity, 4), dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.int32)
+        self.prev_y = np.zeros(capacity, dtype=np.int32)
+        self.first_seen = np.zeros(capacity, dtype=np.float64)
+        self.last_seen = np.zeros(capacity, dtype=np.float64)
+        self.counted = np.zeros(capacity, dtype=bool)
+        self.velocity = np.zeros((capacity, 2), dtype=np.float32)  # Pixels per second
+
+        # Ring buffers; the counters hold the total number of pushes
+        self.positions = np.zeros((capacity, self.positions_history, 2), dtype=np.float32)
+        self.world_positions = np.zeros((capacity, self.positions_history, 2), dtype=np.float32)
+        self.position_times = np.zeros((capacity, self.positions_history), dtype=np.float64)
+        self.position_count = np.zeros(capacity, dtype=np.int64)
+        self.speeds = np.zeros((capacity, self.speed_history), dtype=np.float32)
+        self.speed_count = np.zeros(capacity, dtype=np.int64)
+
+    def _grow(self):
+        old = {name: getattr(self, name) for name in (
+            'active', 'ids', 'boxes', 'y', 'prev_y', 'first_seen', 'last_seen',
+            'counted', 'velocity', 'positions', 'world_positions', 'position_times',
+            'position_count',
+            'speeds', 'speed_count')}
+        old_capacity = self.capacity
+        self._allocate(old_capacity * 2)
+        for name, values in old.items():
+            getattr(self, name)[:old_capacity] = values
+
+    def __len__(self):
+        return int(self.active.sum())
+
+    def clear(self):
+        self.active[:] = False
+
+    def slots(self):
+        return np.flatnonzero(self.active)
+
+    def add(self, box, timestamp):
+        free = np.flatnonzero(~self.active)
+        if len(free) == 0:
+            self._grow()
+            free = np.flatnonzero(~self.active)
+        slot = int(free[0])
+
+        x, y, w, h = box
+        self.active[slot] = True
+        self.ids[slot] = self._next_id
+        self._next_id += 1
+        self.boxes[slot] = box
+        self.y[slot] = y
+        self.prev_y[slot] = y
+        self.first_seen[slot] = timestamp
+        self.last_seen[slot] = timestamp
+        self.counted[slot] = False
+        self.velocity[slot] = 0
+        self.position_count[slot] = 0
+        self.speed_count[slot] = 0
+        self._push_position(slot, x + w//2, y + h//2, timestamp)
+        return slot
+
+    def update(self, slot, box, timestamp):
+        x, y, w, h = box
+        dt = timestamp - self.last_seen[slot]
+        if dt > 0:
+            self.velocity[slot, 0] = (x - self.boxes[slot, 0]) / dt
+            self.velocity[slot, 1] = (y - self.boxes[slot, 1]) / dt
+        self.boxes[slot] = box
+        self.prev_y[slot] = self.y[slot]
+        self.y[slot] = y
+        self.last_seen[slot] = timestamp
+        self._push_position(slot, x + w//2, y + h//2, timestamp)
+
+    def _push_position(self, slot, cx, cy, timestamp):
+        head = self.position_count[slot] % self.positions_history
+        self.positions[slot, head, 0] = cx
+        self.positions[slot, head, 1] = cy
+        self.position_times[slot, head] = timestamp
+        self.position_count[slot] += 1
+
+    def set_world_positions(self, slots, points):
+        """Ground positions in metres of the centroids just pushed for the given slots."""
+        heads = (self.position_count[slots] - 1) % self.positions_history
+        self.world_positions[slots, heads] = points
+
+    def _ring_order(self, slot):
+        count = min(self.position_count[slot], self.positions_history)
+        head = self.position_count[slot] % self.positions_history
+        return (np.arange(count) + head - count) % self.positions_history
+
+    def recent_positions(self, slot):
+        """Stored centroids of a track, oldest first."""
+        return self.positions[slot, self._ring_order(slot)]
+
+    def recent_world_positions(self, slot):
+        """Stored ground positions of a track in metres, oldest first."""
+        return self.world_positions[slot, self._ring_order(slot)]
+
+    def recent_position_times(self, slot):
+        """Timestamps of the stored centroids of a track, oldest first."""
+        return self.position_times[slot, self._ring_order(slot)]
+
+    def push_speed(self, slot, speed):
+        """Store a speed reading and return the average of the stored ones."""
+        self.speeds[slot, self.speed_count[slot] % self.speed_history] = speed
+        self.speed_count[slot] += 1
+        count = min(self.speed_count[slot], self.speed_history)
+        return float(self.speeds[slot, :count].mean())
+
+    def average_speeds(self, slots):
+        """Average of the stored speed readings of each track; 0 before the first."""
+        count = np.minimum(self.speed_count[slots], self.speed_history)
+        stored = np.arange(self.speed_history) < count[:, None]
+        total = np.where(stored, self.speeds[slots], 0).sum(axis=1)
+        return total / np.maximum(count, 1)
+
+    def predict_boxes(self, slots, timestamp):
+        """Boxes of the given tracks moved on at constant velocity to timestamp."""
+        boxes = self.boxes[slots].astype(np.float32)
+        dt = timestamp - self.last_seen[slots]
+        boxes[:, :2] += self.velocity[slots] * dt[:, None]
+        return np.round(boxes).astype(np.int32)
+
+    def remove_older_than(self, cutoff):
+        self.active &= self.last_seen >= cutoff
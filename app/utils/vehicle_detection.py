@@ -1,83 +1,258 @@
 import cv2
+import json
 import numpy as np
-from datetime import datetime
-from collections import deque
+import time
 from .constants import *  # Import constants
+from .blobs import BLOB_BACKENDS, BLOB_TABLES
+from .calibration import GroundPlane
+from .config import ConfigFile, config_path
+from .metrics import create_metrics
+from .preprocessing import FramePreprocessor
+from .timeseries import TrafficHistory
+from .tracking import match_boxes, TrackStore
 
 class VehicleDetector:
-    def __init__(self):
+    def __init__(self, camera=None):
+        # Settings start from constants.py; a camera's config file overrides
+        # them and is re-applied between frames whenever it changes
+        self.config = ConfigFile(config_path(camera)) if camera else None
+        
         # Background subtractor with history
-        self.bg_subtractor = cv2.createBackgroundSubtractorMOG2(
-            history=BG_HISTORY,
-            varThreshold=BG_THRESHOLD,
-            detectShadows=BG_SHADOW
-        )
+        self.bg_history = BG_HISTORY
+        self.bg_threshold = BG_THRESHOLD
+        self.bg_shadow = BG_SHADOW
+        self.bg_subtractor = self.create_bg_subtractor()
         
         # Vehicle tracking
-        self.vehicles = {}
+        self.tracks = TrackStore(
+            positions_history=POSITIONS_HISTORY,
+            speed_history=SPEED_HISTORY
+        )
         self.vehicle_count = 0
         self.current_speeds = []
+        self.current_slots = np.zeros(0, dtype=np.int64)  # Track of each box last returned
+        self.crossings = []  # Line crossings seen in the last frame
+        self.history = TrafficHistory()  # Rolling flow, speed and occupancy
         self.min_area = MIN_CONTOUR_AREA
+        self.min_aspect_ratio = MIN_ASPECT_RATIO
+        self.max_aspect_ratio = MAX_ASPECT_RATIO
         self.ref_iou = IOU_THRESHOLD
         
+        # Pixel to metre mapping, from a calibrated homography when there is one
+        self.ground = GroundPlane()
+        self._ground_key = None
+        
         # Detection line (middle of frame)
+        self.line_position = DETECTION_LINE_POSITION
         self.detection_line_y = None
         
+        # Region of interest and processing scale
+        self.roi_mode = ROI_MODE
+        self.roi_band_height = ROI_BAND_HEIGHT
+        self.roi_polygon = ROI_POLYGON
+        self.processing_scale = PROCESSING_SCALE
+        self.blob_backend = BLOB_BACKEND
+        self.preprocessor = FramePreprocessor()
+        
+        # Per-stage timings, a no-op unless ENABLE_METRICS is set
+        self.metrics = create_metrics()
+        self._roi = None
+        self._roi_key = None
+        
         # Store last average speed
         self.last_avg_speed = 0
+        self.last_detection_time = None
+        self.reload_config()
         
-    def detect_vehicles(self, frame):
-        height, width = frame.shape[:2]
-        if self.detection_line_y is None:
-            self.detection_line_y = height // 2
+    def create_bg_subtractor(self):
+        return cv2.createBackgroundSubtractorMOG2(
+            history=self.bg_history,
+            varThreshold=self.bg_threshold,
+            detectShadows=self.bg_shadow
+        )
+        
+    def reload_config(self):
+        """Apply the camera's config file if it changed since the last check."""
+        if self.config is not None:
+            values = self.config.poll()
+            if values is not None:
+                try:
+                    self.apply_config(values)
+                except Exception as e:
+                    # Keep running on the last good settings
+                    print(f"Error applying config {self.config.path}: {str(e)}")
+                
+    def apply_config(self, values):
+        """Apply a full set of settings (see config.DEFAULTS) to the running detector."""
+        # Build what can fail before changing anything, so a bad config
+        # leaves the detector as it was
+        ground_key = json.dumps([values['homography'], values['image_size'],
+                                 values['meters_per_pixel']])
+        ground = self.ground
+        if ground_key != self._ground_key:
+            ground = GroundPlane(values['homography'], values['image_size'],
+                                 values['meters_per_pixel'])
+        
+        self.min_area = values['min_contour_area']
+        self.min_aspect_ratio = values['min_aspect_ratio']
+        self.max_aspect_ratio = values['max_aspect_ratio']
+        self.ref_iou = values['iou_threshold']
+        self.blob_backend = values['blob_backend']
+        
+        # MOG2 settings change in place, keeping the learned background
+        self.bg_history = values['bg_history']
+        self.bg_threshold = values['bg_threshold']
+        self.bg_shadow = values['bg_shadow']
+        self.bg_subtractor.setHistory(self.bg_history)
+        self.bg_subtractor.setVarThreshold(self.bg_threshold)
+        self.bg_subtractor.setDetectShadows(self.bg_shadow)
+        
+        # A different region does need a new background model (see get_roi)
+        self.roi_mode = values['roi_mode']
+        self.roi_band_height = values['roi_band_height']
+        self.roi_polygon = values['roi_polygon']
+        self.processing_scale = values['processing_scale']
+        
+        if values['detection_line_position'] != self.line_position:
+            self.line_position = values['detection_line_position']
+            self.detection_line_y = None
+            
+        # The pixel lookup table is only rebuilt when the calibration changed
+        self.ground = ground
+        self._ground_key = ground_key
+        
+    def blob_params(self):
+        """Settings that determine which boxes extract_boxes finds."""
+        return {
+            'min_area': self.min_area,
+            'aspect_ratio': [self.min_aspect_ratio, self.max_aspect_ratio],
+            'blob_backend': self.blob_backend,
+            'background': [self.bg_history, self.bg_threshold, self.bg_shadow],
+            'roi': [self.roi_mode, self.roi_band_height, self.roi_polygon,
+                    self.line_position if self.roi_mode == 'band' else None],
+            'processing_scale': self.processing_scale
+        }
+        
+    def tracking_params(self):
+        """Settings that determine tracks, speeds and counts for given boxes."""
+        ground = self.ground
+        return {
+            'iou_threshold': self.ref_iou,
+            'history': [self.tracks.positions_history, self.tracks.speed_history, TRACKING_MEMORY],
+            'speed': [MIN_SPEED_TIME, MAX_SPEED],
+            'line_position': self.line_position,
+            'ground': [None if ground.homography is None else ground.homography.tolist(),
+                       ground.image_size, ground.meters_per_pixel]
+        }
+        
+    def detect_vehicles(self, frame, timestamp=None):
+        # Frame time in seconds; video files pass their own position so
+        # speeds stay correct however fast frames are processed
+        if timestamp is None:
+            timestamp = time.time()
             
-        # Process frame
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        blur = cv2.GaussianBlur(gray, (5, 5), 0)
+        # Pick up recalibration without restarting the stream
+        self.reload_config()
+        
+        boxes = self.extract_boxes(frame)
+        height, width = frame.shape[:2]
+        return self.process_boxes(boxes, timestamp, (width, height))
+        
+    def foreground_mask(self, frame):
+        """Cleaned foreground mask of the region of interest, with its (x0, y0) offset."""
+        height, width = frame.shape[:2]
+        
+        # Only process the region of interest, optionally downscaled
+        x0, y0, x1, y1, size, roi_mask = self.get_roi(width, height)
+        ksize = max(3, int(5 * self.processing_scale) | 1)
+        fg_mask = self.preprocessor.process(
+            frame[y0:y1, x0:x1], size, self.bg_subtractor, ksize, roi_mask, self.metrics
+        )
+        return fg_mask, x0, y0
+        
+    def _to_frame(self, boxes, x0, y0):
+        # Back to full-frame coordinates
+        if self.processing_scale != 1.0:
+            boxes = np.round(boxes / self.processing_scale).astype(np.int32)
+        boxes[:, 0] += x0
+        boxes[:, 1] += y0
+        return boxes
         
-        # Apply background subtraction
-        fg_mask = self.bg_subtractor.apply(blur)
+    def extract_boxes(self, frame):
+        """Foreground blobs of a frame as an (N, 4) array of x, y, w, h boxes."""
+        fg_mask, x0, y0 = self.foreground_mask(frame)
+        scale = self.processing_scale
         
-        # Clean up mask
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
-        fg_mask = cv2.morphologyEx(fg_mask, cv2.MORPH_OPEN, kernel)
-        fg_mask = cv2.morphologyEx(fg_mask, cv2.MORPH_CLOSE, kernel)
+        # Find blobs with a vehicle-like size and shape
+        extract_blobs = BLOB_BACKENDS[self.blob_backend]
+        with self.metrics.time('blobs'):
+            boxes = extract_blobs(fg_mask, self.min_area * scale * scale,
+                                  self.min_aspect_ratio, self.max_aspect_ratio)
+        return self._to_frame(boxes, x0, y0)
         
-        # Find contours
-        contours, _ = cv2.findContours(fg_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    def blob_table(self, frame):
+        """Every foreground blob of a frame before size and shape filtering.
         
+        Returns full-frame boxes and their areas in full-frame pixels, so
+        filter_blobs can try any filter settings on them later.
+        """
+        fg_mask, x0, y0 = self.foreground_mask(frame)
+        boxes, areas = BLOB_TABLES[self.blob_backend](fg_mask)
+        scale = self.processing_scale
+        return self._to_frame(boxes, x0, y0), areas / (scale * scale)
+        
+    def process_boxes(self, boxes, timestamp, frame_size):
+        """Track, time and count one frame's boxes; the second half of detect_vehicles."""
+        width, height = frame_size
+        # Time went backwards: a new camera or video is reusing this detector
+        if self.last_detection_time is not None and timestamp < self.last_detection_time:
+            self.reset_tracking()
+        if self.detection_line_y is None:
+            self.detection_line_y = int(height * self.line_position)
+            
         # Reset current frame data
-        boxes = []
         self.current_speeds = []
+        self.crossings = []
         
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            if area < self.min_area:
-                continue
-                
-            x, y, w, h = cv2.boundingRect(contour)
-            aspect_ratio = float(w) / h
-            
-            # Filter out non-vehicle shapes
-            if not (MIN_ASPECT_RATIO < aspect_ratio < MAX_ASPECT_RATIO):
-                continue
+        # Track all boxes in one step
+        with self.metrics.time('track'):
+            matches, new_vehicles, lost_vehicles = self.track_vehicles(boxes, timestamp)
+        
+        tracks = self.tracks
+        with self.metrics.time('speed'):
+            # Ground positions of every tracked centroid in one lookup
+            updated = sorted(matches + new_vehicles)
+            self.current_slots = np.array([slot for _, slot in updated], dtype=np.int64)
+            if updated:
+                index, slots = np.array(updated).T
+                centroids = boxes[index, :2] + boxes[index, 2:] // 2
+                tracks.set_world_positions(slots, self.ground.to_world(centroids, (width, height)))
                 
-            # Track vehicle
-            vehicle_id = self.track_vehicle(x, y, w, h)
-            if vehicle_id:
-                boxes.append([x, y, w, h])
-                speed = self.calculate_speed(vehicle_id, y)
+            for i, slot in updated:
+                speed = self.calculate_speed(slot)
                 self.current_speeds.append(speed)
                 
                 # Update count if vehicle crosses line
-                if not self.vehicles[vehicle_id]['counted']:
-                    if (self.vehicles[vehicle_id]['prev_y'] < self.detection_line_y and 
-                        y >= self.detection_line_y):
+                if not tracks.counted[slot]:
+                    if tracks.prev_y[slot] < self.detection_line_y <= tracks.y[slot]:
                         self.vehicle_count += 1
-                        self.vehicles[vehicle_id]['counted'] = True
+                        tracks.counted[slot] = True
+                        self.crossings.append({
+                            'timestamp': timestamp,
+                            'track_id': int(tracks.ids[slot]),
+                            'speed': round(speed, 2),
+                            'box': [int(v) for v in boxes[i]]
+                        })
+        
+        # Feed the rolling stats; the line is occupied while a box spans it
+        line_y = self.detection_line_y
+        occupied = bool(np.any((boxes[:, 1] <= line_y) & (line_y < boxes[:, 1] + boxes[:, 3])))
+        self.history.record(timestamp, [c['speed'] for c in self.crossings], occupied)
         
         # Clean up old vehicles
-        self.cleanup_old_vehicles()
+        self.cleanup_old_vehicles(timestamp)
+        self.last_detection_time = timestamp
+        self.metrics.set('active_tracks', len(tracks))
         
         # Calculate and store average speed
         if self.current_speeds:
@@ -86,92 +261,123 @@ class VehicleDetector:
         # Return last known speed if no current vehicles
         current_speeds = self.current_speeds if self.current_speeds else [self.last_avg_speed]
         
-        return boxes, current_speeds, self.vehicle_count
-        
-    def track_vehicle(self, x, y, w, h):
-        current_time = datetime.now()
-        current_box = [x, y, w, h]
-        
-        # Check existing vehicles
-        for vid, vehicle in self.vehicles.items():
-            if 'box' in vehicle:
-                iou = self.calculate_iou(current_box, vehicle['box'])
-                if iou > self.ref_iou:
-                    # Update vehicle data
-                    vehicle.update({
-                        'box': current_box,
-                        'prev_y': vehicle['y'],
-                        'y': y,
-                        'last_seen': current_time,
-                        'positions': vehicle['positions'] + [(x + w//2, y + h//2)]
-                    })
-                    return vid
-        
-        # New vehicle
-        new_id = f"vehicle_{len(self.vehicles)}"
-        self.vehicles[new_id] = {
-            'box': current_box,
-            'y': y,
-            'prev_y': y,
-            'first_seen': current_time,
-            'last_seen': current_time,
-            'counted': False,
-            'positions': [(x + w//2, y + h//2)]
-        }
-        return new_id
+        return boxes.tolist(), current_speeds, self.vehicle_count
         
-    def calculate_speed(self, vehicle_id, current_y):
-        vehicle = self.vehicles[vehicle_id]
-        if len(vehicle['positions']) < POSITIONS_HISTORY:
-            return 0
+    def predict_vehicles(self, timestamp):
+        """Estimate where the vehicles seen in the last detection are at timestamp.
+        
+        Used for frames that skip detection. Track state is left untouched, so
+        speeds are still measured between real detections only.
+        """
+        if self.last_detection_time is None or timestamp < self.last_detection_time:
+            return []
+        tracks = self.tracks
+        slots = tracks.slots()
+        slots = slots[tracks.last_seen[slots] >= self.last_detection_time]
+        self.current_slots = slots
+        return tracks.predict_boxes(slots, timestamp).tolist()
+
+    def box_labels(self):
+        """Track ID and smoothed speed of each box from the last detection or prediction."""
+        tracks = self.tracks
+        slots = self.current_slots
+        speeds = np.minimum(tracks.average_speeds(slots), MAX_SPEED)
+        return [f"#{track_id} {speed:.0f} km/h" if speed > 0 else f"#{track_id}"
+                for track_id, speed in zip(tracks.ids[slots].tolist(), speeds.tolist())]
+        
+    def get_roi(self, width, height):
+        """Crop (x0, y0, x1, y1), processing size and optional polygon mask for a frame size."""
+        band_line = self.line_position if self.roi_mode == 'band' else None
+        key = (width, height, self.roi_mode, self.roi_band_height, band_line,
+               tuple(map(tuple, self.roi_polygon)), self.processing_scale)
+        if key == self._roi_key:
+            return self._roi
             
-        # Use longer time window
-        time_diff = (vehicle['last_seen'] - vehicle['first_seen']).total_seconds()
-        if time_diff > MIN_SPEED_TIME:
-            # Use more positions for average
-            positions = vehicle['positions'][-POSITIONS_HISTORY:]  # Last 10 positions
-            total_distance = 0
+        x0, y0, x1, y1 = 0, 0, width, height
+        polygon = None
+        mask = None
+        if self.roi_mode == 'band':
+            line_y = int(height * self.line_position)
+            half_band = int(height * self.roi_band_height / 2)
+            y0, y1 = max(0, line_y - half_band), min(height, line_y + half_band)
+        elif self.roi_mode == 'polygon' and len(self.roi_polygon) >= 3:
+            polygon = np.array(self.roi_polygon, dtype=np.int32)
+            x, y, w, h = cv2.boundingRect(polygon)
+            x0, y0 = max(0, x), max(0, y)
+            x1, y1 = min(width, x + w), min(height, y + h)
             
-            # Calculate average speed over multiple points
-            for i in range(len(positions)-1):
-                p1 = positions[i]
-                p2 = positions[i+1]
-                total_distance += np.sqrt((p2[0] - p1[0])**2 + (p2[1] - p1[1])**2)
+        scale = self.processing_scale
+        size = (max(1, int(round((x1 - x0) * scale))), max(1, int(round((y1 - y0) * scale))))
+        if polygon is not None:
+            # Mask at processing size, relative to the crop
+            mask = np.zeros((size[1], size[0]), dtype=np.uint8)
+            points = np.round((polygon - [x0, y0]) * scale).astype(np.int32)
+            cv2.fillPoly(mask, [points], 255)
             
-            # Better pixel to meter conversion (calibrated for typical road view)
-            meters_per_pixel = METERS_PER_PIXEL  # More realistic value
-            speed = (total_distance * meters_per_pixel / time_diff) * 3.6
+        # The background model is tied to the processed region
+        if self._roi_key is not None:
+            self.bg_subtractor = self.create_bg_subtractor()
             
-            # Smooth the speed using moving average
-            if 'speed_history' not in vehicle:
-                vehicle['speed_history'] = []
-            vehicle['speed_history'].append(speed)
-            if len(vehicle['speed_history']) > SPEED_HISTORY:
-                vehicle['speed_history'].pop(0)
-                
-            avg_speed = sum(vehicle['speed_history']) / len(vehicle['speed_history'])
-            return min(avg_speed, MAX_SPEED)
-        return 0
+        self._roi = (x0, y0, x1, y1, size, mask)
+        self._roi_key = key
+        return self._roi
+        
+    def track_vehicles(self, boxes, current_time):
+        """Match this frame's boxes against every tracked vehicle at once.
+        
+        Returns (matches, new_vehicles, lost_vehicles): matches and new_vehicles
+        are lists of (box index, track slot), lost_vehicles lists the slots of
+        tracked vehicles that were not seen in this frame.
+        """
+        tracks = self.tracks
+        slots = tracks.slots()
+        
+        pairs, unmatched_boxes, unmatched_tracks = match_boxes(
+            boxes, tracks.boxes[slots], self.ref_iou
+        )
+        
+        # Update matched vehicles
+        matches = []
+        for i, j in pairs:
+            slot = int(slots[j])
+            tracks.update(slot, boxes[i], current_time)
+            matches.append((i, slot))
         
-    def calculate_iou(self, box1, box2):
-        x1, y1, w1, h1 = box1
-        x2, y2, w2, h2 = box2
+        # New vehicles
+        new_vehicles = [(i, tracks.add(boxes[i], current_time)) for i in unmatched_boxes]
         
-        xi1 = max(x1, x2)
-        yi1 = max(y1, y2)
-        xi2 = min(x1 + w1, x2 + w2)
-        yi2 = min(y1 + h1, y2 + h2)
+        lost_vehicles = [int(slots[j]) for j in unmatched_tracks]
+        return matches, new_vehicles, lost_vehicles
         
-        inter_area = max(0, xi2 - xi1) * max(0, yi2 - yi1)
-        box1_area = w1 * h1
-        box2_area = w2 * h2
+    def calculate_speed(self, slot):
+        tracks = self.tracks
+        if tracks.position_count[slot] < tracks.positions_history:
+            return 0
+            
+        # Only time tracks seen for long enough, over the span of the
+        # stored positions rather than the whole track
+        times = tracks.recent_position_times(slot)
+        time_diff = times[-1] - times[0]
+        if tracks.last_seen[slot] - tracks.first_seen[slot] > MIN_SPEED_TIME and time_diff > 0:
+            # Sum the distance in metres between consecutive ground positions
+            positions = tracks.recent_world_positions(slot)
+            steps = np.diff(positions, axis=0)
+            total_distance = float(np.hypot(steps[:, 0], steps[:, 1]).sum())
+            if not np.isfinite(total_distance):
+                return 0  # Part of the track lies off the calibrated ground plane
+            
+            speed = (total_distance / time_diff) * 3.6
+            
+            # Smooth the speed using moving average
+            avg_speed = tracks.push_speed(slot, speed)
+            return min(avg_speed, MAX_SPEED)
+        return 0
         
-        iou = inter_area / float(box1_area + box2_area - inter_area)
-        return iou
+    def reset_tracking(self):
+        """Forget every track, e.g. when a new source restarts the clock."""
+        self.tracks.clear()
+        self.current_slots = np.zeros(0, dtype=np.int64)
+        self.last_detection_time = None
         
-    def cleanup_old_vehicles(self):
-        current_time = datetime.now()
-        self.vehicles = {
-            vid: vehicle for vid, vehicle in self.vehicles.items()
-            if (current_time - vehicle['last_seen']).seconds < 1
-        }
\ No newline at end of file
+    def cleanup_old_vehicles(self, current_time):
+        self.tracks.remove_older_than(current_time - TRACKING_MEMORY)
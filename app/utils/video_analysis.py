@@ -0,0 +1,145 @@
+import time
+import cv2
+import numpy as np
+from .constants import *  # Import constants
+from .detection_cache import file_digest, params_digest
+from .vehicle_detection import VehicleDetector
+from .video_stream import FrameClock
+
+
+def init_worker():
+    """Pool initializer for CPU-bound analysis workers."""
+    # One process per core already; keep OpenCV from oversubscribing
+    cv2.setNumThreads(1)
+
+
+def count_frames(path):
+    cap = cv2.VideoCapture(path)
+    try:
+        return int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+
+
+def decoded_frames(cap, first_frame=0, end_frame=None):
+    """Decode and resize frames; yields (frame_index, frame, timestamp)."""
+    clock = FrameClock(cap, is_video=True)
+    if first_frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first_frame)
+        clock.frame_index = first_frame
+
+    frame_index = first_frame
+    while end_frame is None or frame_index < end_frame:
+        success, frame = cap.read()
+        if not success:
+            break
+        timestamp = clock.tick()
+
+        yield frame_index, cv2.resize(frame, (FRAME_WIDTH, FRAME_HEIGHT)), timestamp
+        frame_index += 1
+
+
+def decoded_boxes(cap, detector, first_frame, end_frame):
+    """Decode frames and extract their boxes; yields (frame_index, boxes, timestamp)."""
+    for frame_index, frame, timestamp in decoded_frames(cap, first_frame, end_frame):
+        yield frame_index, detector.extract_boxes(frame), timestamp
+
+
+def cached_boxes(cached, first_frame):
+    """Replay boxes stored by a DetectionCache; yields (frame_index, boxes, timestamp)."""
+    boxes, offsets, timestamps = cached
+    for i in range(len(timestamps)):
+        yield first_frame + i, np.array(boxes[offsets[i]:offsets[i + 1]]), float(timestamps[i])
+
+
+def analyze_video(path, start_frame=0, end_frame=None, warmup_frames=0, progress=None, cache=None,
+                  digest=None):
+    """Run detection over a video file as fast as frames can be decoded.
+
+    Only crossings between start_frame and end_frame are reported. The
+    warmup_frames before start_frame are run through the detector first so
+    the background model and tracks are settled when a slice begins.
+    progress, if given, is called as progress(frames_done, frames_total).
+
+    With a DetectionCache, a repeat run over the same file content and
+    settings returns the stored result; if only tracking settings changed,
+    the stored boxes are replayed through tracking without decoding.
+    digest is the file's content hash, if the caller already has it.
+    """
+    started = time.time()
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video: {path}")
+
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if end_frame is None or (total_frames > 0 and end_frame > total_frames):
+        end_frame = total_frames if total_frames > 0 else None
+
+    detector = VehicleDetector()
+    first_frame = max(0, start_frame - warmup_frames)
+    frames_total = (end_frame - first_frame) if end_frame is not None else 0
+
+    cache_status = None
+    cached = None
+    if cache is not None:
+        key = params_digest(digest or file_digest(path), first_frame, end_frame,
+                            FRAME_WIDTH, FRAME_HEIGHT, detector.blob_params())
+        tracking_key = params_digest(start_frame, detector.tracking_params())
+        result = cache.load_result(key, tracking_key)
+        if result is not None:
+            cap.release()
+            if progress:
+                progress(frames_total, frames_total)
+            return dict(result, source=path, cache='result',
+                        processing_time=round(time.time() - started, 3))
+        cached = cache.load_boxes(key)
+        cache_status = 'boxes' if cached is not None else 'miss'
+
+    if cached is not None:
+        cap.release()
+        frames = cached_boxes(cached, first_frame)
+    else:
+        frames = decoded_boxes(cap, detector, first_frame, end_frame)
+
+    crossings = []
+    frame_boxes = []
+    timestamps = []
+    frame_index = first_frame
+    frame_size = (FRAME_WIDTH, FRAME_HEIGHT)
+
+    try:
+        for frame_index, boxes, timestamp in frames:
+            if cache_status == 'miss':
+                frame_boxes.append(boxes.copy())
+                timestamps.append(timestamp)
+            detector.process_boxes(boxes, timestamp, frame_size)
+
+            # Crossings during warm-up belong to the previous slice
+            if frame_index >= start_frame:
+                for crossing in detector.crossings:
+                    crossings.append(dict(crossing, frame=frame_index))
+
+            frame_index += 1
+            if progress:
+                progress(frame_index - first_frame, frames_total)
+    finally:
+        cap.release()
+
+    speeds = [c['speed'] for c in crossings if c['speed'] > 0]
+    result = {
+        'source': path,
+        'start_frame': start_frame,
+        'end_frame': frame_index,
+        'frames': max(0, frame_index - start_frame),
+        'vehicle_count': len(crossings),
+        'average_speed': round(sum(speeds) / len(speeds), 2) if speeds else 0,
+        'max_speed': round(max(speeds), 2) if speeds else 0,
+        'crossings': crossings
+    }
+
+    if cache_status == 'miss':
+        cache.store_boxes(key, frame_boxes, timestamps)
+    if cache is not None:
+        cache.store_result(key, tracking_key, result)
+
+    return dict(result, cache=cache_status, processing_time=round(time.time() - started, 3))
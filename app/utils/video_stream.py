@@ -0,0 +1,386 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from .constants import *  # Import constants
+from .metrics import NULL_METRICS
+
+
+def draw_annotations(frame, boxes, line_y=None, labels=None):
+    # Draw counting line
+    if line_y is None:
+        line_y = int(FRAME_HEIGHT * DETECTION_LINE_POSITION)
+    cv2.line(frame, (0, line_y), (FRAME_WIDTH, line_y), (255, 0, 0), 2)
+
+    # Draw boxes
+    for box in boxes:
+        x, y, w, h = box
+        cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+
+    # Label boxes, e.g. with track ID and speed
+    for box, label in zip(boxes, labels or ()):
+        x, y = box[0], box[1]
+        cv2.putText(frame, label, (x, max(12, y - 4)), cv2.FONT_HERSHEY_SIMPLEX, 0.45,
+                    (0, 255, 0), 1, cv2.LINE_AA)
+
+
+class FrameClock:
+    """Timestamps in seconds for the frames read from a capture.
+    
+    Video files are timed by their own position, so detection sees the
+    recorded timing however fast frames are processed. Live cameras use the
+    wall clock.
+    """
+
+    def __init__(self, capture, is_video=False):
+        self.capture = capture
+        self.is_video = is_video
+        fps = capture.get(cv2.CAP_PROP_FPS) if is_video else 0
+        self.fps = fps if fps and fps > 0 else FPS
+        self.frame_index = 0
+        self.offset = 0.0
+        self.last_timestamp = 0.0
+
+    def tick(self):
+        """Timestamp of the frame that was just read."""
+        if not self.is_video:
+            return time.time()
+
+        position = self.capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        if position <= 0 and self.frame_index > 0:
+            position = self.frame_index / self.fps
+        self.frame_index += 1
+        self.last_timestamp = self.offset + position
+        return self.last_timestamp
+
+    def rewind(self):
+        # Keep time moving forward when a video loops
+        self.offset = self.last_timestamp + 1 / self.fps
+        self.frame_index = 0
+
+
+def encode_frame(frame, boxes, metrics=NULL_METRICS, line_y=None):
+    started = time.perf_counter()
+    draw_annotations(frame, boxes, line_y)
+    drawn = time.perf_counter()
+    ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    metrics.observe('draw', drawn - started)
+    metrics.observe('encode', time.perf_counter() - drawn)
+    return buffer.tobytes() if ret else None
+
+
+class VideoStream:
+    """Runs capture, detection and encoding once and shares each frame with every viewer.
+    
+    Work is split into stages connected by bounded queues: a decoder thread,
+    a single detector thread (the background model is stateful, so frames
+    must go through it in order) and a pool that annotates and encodes
+    frames in parallel. Encoded frames are published in capture order.
+    
+    With load shedding on, live cameras always hand the newest frame to
+    detection and drop stale ones, and full detection only runs on every
+    frame_skip-th frame, with frame_skip following the measured detection
+    time. Frames in between show tracks moved on at constant velocity.
+    """
+
+    def __init__(self, detector, capture, is_video=False, realtime=True,
+                 decode_queue_size=DECODE_QUEUE_SIZE,
+                 encode_queue_size=ENCODE_QUEUE_SIZE,
+                 encode_workers=ENCODE_WORKERS,
+                 load_shedding=LOAD_SHEDDING,
+                 stats_events=None,
+                 event_log=None,
+                 recorder=None):
+        self.detector = detector
+        self.capture = capture
+        self.is_video = is_video
+        self.is_paused = False
+        self.clock = FrameClock(capture, is_video)
+        self.metrics = detector.metrics
+        self.stats_events = stats_events
+        self.event_log = event_log
+        self.recorder = recorder  # Optional VideoRecorder fed by the detector thread
+
+        # Video time starts at zero; anchor it to when playback started
+        self.time_origin = time.time() if is_video else 0.0
+
+        # Pace video files for viewing; speeds don't depend on it
+        self.realtime = realtime
+
+        # Adaptive load shedding; never skip frames when analysing a file unpaced
+        self.load_shedding = load_shedding and (realtime or not is_video)
+        self.frame_skip = 1
+        self.dropped_frames = 0
+        self._frame_interval = 1 / FPS  # Smoothed time between captured frames
+        self._detect_time = 0.0         # Smoothed time spent in detection
+        self._frames_since_detection = 0
+        self._processed_fps = 0.0
+        self._last_detection = None
+
+        # Queues between stages; a live camera under load shedding hands
+        # detection a single slot, so it always gets the newest frame
+        if self.load_shedding and not is_video:
+            decode_queue_size = 1
+        self._decoded = queue.Queue(maxsize=decode_queue_size)
+        self._encoding = queue.Queue(maxsize=encode_queue_size)
+        self._encode_workers = encode_workers
+        self._encoder = None
+        self._free_buffers = queue.Queue()  # Frame buffers no stage is using
+
+        # Latest encoded frame, guarded by the condition
+        self._condition = threading.Condition()
+        self._frame = None
+        self._frame_id = 0
+        self._subscribers = 0
+
+        self._running = False
+        self._threads = []
+
+    @property
+    def is_running(self):
+        return self._running
+
+    def start(self):
+        self._running = True
+        self._encoder = ThreadPoolExecutor(max_workers=self._encode_workers)
+        self._threads = [
+            threading.Thread(target=target, daemon=True)
+            for target in (self._decode, self._detect, self._publish_encoded)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._running = False
+        with self._condition:
+            self._condition.notify_all()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=2)
+        if self._encoder:
+            self._encoder.shutdown(wait=False)
+        if self.event_log is not None:
+            self.event_log.flush()
+        if self.recorder is not None:
+            self.recorder.stop()
+        self.capture.release()
+
+    def _put(self, q, item):
+        # Block while the next stage is full, but give up once stopped
+        while self._running:
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while self._running:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def _put_latest(self, q, item):
+        # Make room by dropping the oldest frame instead of waiting
+        while True:
+            try:
+                q.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    frame, _ = q.get_nowait()
+                    self._release_frame(frame)
+                    self.dropped_frames += 1
+                except queue.Empty:
+                    pass
+
+    def _release_frame(self, frame):
+        self._free_buffers.put(frame)
+
+    def _decode(self):
+        # Frames are resized into a fixed pool of buffers; a buffer only goes
+        # back to the pool once detection and encoding are done with it
+        pool_size = self._decoded.maxsize + self._encoding.maxsize + self._encode_workers + 2
+        for buffer in np.empty((pool_size, FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8):
+            self._free_buffers.put(buffer)
+        raw = None
+
+        last_timestamp = None
+        while self._running and self.capture.isOpened():
+            if self.is_paused:
+                time.sleep(0.1)
+                continue
+
+            if self.is_video and self.realtime:
+                time.sleep(1/self.clock.fps)
+
+            with self.metrics.time('read'):
+                success, raw = self.capture.read(raw)
+            if not success:
+                if self.is_video:
+                    self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    self.clock.rewind()
+                    continue
+                break
+            timestamp = self.clock.tick()
+            if last_timestamp is not None and timestamp > last_timestamp:
+                self._frame_interval = 0.9 * self._frame_interval + 0.1 * (timestamp - last_timestamp)
+            last_timestamp = timestamp
+
+            if self.load_shedding and not self.is_video:
+                # Never wait for later stages; drop the frame if every buffer is busy
+                try:
+                    frame = self._free_buffers.get_nowait()
+                except queue.Empty:
+                    self.dropped_frames += 1
+                    continue
+            else:
+                frame = self._get(self._free_buffers)
+                if frame is None:
+                    break
+
+            with self.metrics.time('resize'):
+                cv2.resize(raw, (FRAME_WIDTH, FRAME_HEIGHT), dst=frame)
+            if self.load_shedding and not self.is_video:
+                self._put_latest(self._decoded, (frame, timestamp))
+            elif not self._put(self._decoded, (frame, timestamp)):
+                break
+
+        # Tell the next stages the source has ended
+        self._put(self._decoded, None)
+
+    def _detect(self):
+        while True:
+            item = self._get(self._decoded)
+            if item is None:
+                break
+            frame, timestamp = item
+
+            try:
+                if self._frames_since_detection + 1 >= self.frame_skip:
+                    started = time.perf_counter()
+                    boxes, speeds, total_count = self.detector.detect_vehicles(frame, timestamp)
+                    self._frames_since_detection = 0
+                    if self.load_shedding:
+                        self._update_frame_skip(time.perf_counter() - started)
+                    self._record_detection()
+                    self.on_detection(timestamp)
+                else:
+                    boxes = self.detector.predict_vehicles(timestamp)
+                    self._frames_since_detection += 1
+            except Exception as e:
+                print(f"Error processing frame: {str(e)}")
+                self._release_frame(frame)
+                continue
+
+            # Copy the frame before the encoder draws on it
+            recorder = self.recorder
+            if recorder is not None:
+                recorder.submit(frame, timestamp, boxes, self.detector.detection_line_y,
+                                self.detector.box_labels())
+
+            # Nobody is watching, so skip drawing and encoding
+            if not self.has_viewers():
+                self._release_frame(frame)
+                continue
+
+            future = self._encoder.submit(encode_frame, frame, boxes, self.metrics,
+                                          self.detector.detection_line_y)
+            future.add_done_callback(lambda _, frame=frame: self._release_frame(frame))
+            if not self._put(self._encoding, future):
+                break
+
+        self._put(self._encoding, None)
+
+    def _record_detection(self):
+        now = time.perf_counter()
+        if self._last_detection is not None and now > self._last_detection:
+            self._processed_fps = 0.9 * self._processed_fps + 0.1 / (now - self._last_detection)
+        self._last_detection = now
+
+        self.metrics.set('processed_fps', round(self._processed_fps, 2))
+        self.metrics.set('dropped_frames', self.dropped_frames)
+        self.metrics.set('frame_skip', self.frame_skip)
+
+    def _update_frame_skip(self, detect_time):
+        # Detect as often as the measured detection time allows
+        self._detect_time = 0.9 * self._detect_time + 0.1 * detect_time
+        needed = int(np.ceil(self._detect_time / max(self._frame_interval, 1e-3)))
+        self.frame_skip = min(MAX_FRAME_SKIP, max(1, needed))
+
+    def _publish_encoded(self):
+        # Futures are queued in capture order, so frames come out in order
+        while True:
+            future = self._get(self._encoding)
+            if future is None:
+                break
+
+            try:
+                frame_bytes = future.result()
+            except Exception as e:
+                print(f"Error encoding frame: {str(e)}")
+                continue
+
+            if frame_bytes is not None:
+                self._publish(frame_bytes)
+
+        self._running = False
+        with self._condition:
+            self._condition.notify_all()
+
+    def has_viewers(self):
+        return self._subscribers > 0
+
+    def on_detection(self, timestamp):
+        # Called on the detector thread after every full detection
+        detector = self.detector
+        if self.event_log is not None and detector.crossings:
+            self.event_log.append(detector.crossings, self.time_origin)
+
+        if self.stats_events is None:
+            return
+        speeds = detector.current_speeds
+        avg_speed = sum(speeds) / len(speeds) if speeds else detector.last_avg_speed
+        self.stats_events.publish({
+            'current_count': detector.vehicle_count,
+            'average_speed': round(avg_speed, 2),
+            'timestamp': time.time(),
+            'camera_status': 'active'
+        }, detector.crossings)
+
+    def _publish(self, frame_bytes):
+        with self._condition:
+            self._frame = frame_bytes
+            self._frame_id += 1
+            self._condition.notify_all()
+
+    def frames(self):
+        """Yield MJPEG parts; frames published while a client is busy are skipped."""
+        with self._condition:
+            self._subscribers += 1
+        last_id = 0
+
+        try:
+            while True:
+                with self._condition:
+                    self._condition.wait_for(
+                        lambda: self._frame_id != last_id or not self._running,
+                        timeout=1.0
+                    )
+                    if not self._running:
+                        return
+                    if self._frame_id == last_id:
+                        continue
+                    last_id = self._frame_id
+                    frame_bytes = self._frame
+
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        finally:
+            with self._condition:
+                self._subscribers -= 1
@@ -0,0 +1,172 @@
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from app.utils import constants
+from app.utils.vehicle_detection import VehicleDetector
+from benchmarks.synthetic import SCENES, SyntheticScene
+
+MATCH_WINDOW = 0.5  # Seconds between a detected and a true crossing to pair them
+WARMUP_FRAMES = 10  # Frames that may allocate buffers before memory counts as steady
+DETECTION_PARAMETERS = (
+    'MIN_CONTOUR_AREA', 'MIN_ASPECT_RATIO', 'MAX_ASPECT_RATIO', 'IOU_THRESHOLD',
+    'BLOB_BACKEND', 'BG_HISTORY', 'BG_THRESHOLD', 'METERS_PER_PIXEL',
+    'POSITIONS_HISTORY', 'SPEED_HISTORY', 'ROI_MODE', 'PROCESSING_SCALE'
+)
+
+
+def match_crossings(detected, truth):
+    """Pair each true crossing with the nearest unused detection in time and position."""
+    used = set()
+    pairs = []
+    for true in truth:
+        best, best_dt = None, MATCH_WINDOW
+        for i, crossing in enumerate(detected):
+            if i in used:
+                continue
+            x, y, w, h = crossing['box']
+            if not x <= true['x'] <= x + w:
+                continue
+            dt = abs(crossing['timestamp'] - true['timestamp'])
+            if dt <= best_dt:
+                best, best_dt = i, dt
+        if best is not None:
+            used.add(best)
+            pairs.append((detected[best], true))
+    return pairs
+
+
+def run_scene(name, frames, seed):
+    scene = SyntheticScene(name, frames, seed)
+
+    # Timing pass
+    detector = VehicleDetector()
+    latencies = []
+    crossings = []
+    for frame, timestamp in scene.frames():
+        started = time.perf_counter()
+        detector.detect_vehicles(frame, timestamp)
+        latencies.append(time.perf_counter() - started)
+        crossings.extend(detector.crossings)
+
+    # Memory pass, kept apart since tracing slows everything down
+    detector = VehicleDetector()
+    peak = steady_peak = 0
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for index, (frame, timestamp) in enumerate(scene.frames()):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        detector.detect_vehicles(frame, timestamp)
+        frame_peak = tracemalloc.get_traced_memory()[1] - before
+        peak = max(peak, frame_peak)
+        if index >= WARMUP_FRAMES:
+            steady_peak = max(steady_peak, frame_peak)
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    latencies = np.array(latencies) * 1000
+    truth = scene.ground_truth
+    pairs = match_crossings(crossings, truth)
+    speed_errors = [abs(d['speed'] - t['speed']) for d, t in pairs if d['speed'] > 0]
+
+    return {
+        'frames': frames,
+        'fps': round(len(latencies) / (latencies.sum() / 1000), 2),
+        'latency_ms': {
+            'mean': round(float(latencies.mean()), 3),
+            'p50': round(float(np.percentile(latencies, 50)), 3),
+            'p95': round(float(np.percentile(latencies, 95)), 3),
+            'p99': round(float(np.percentile(latencies, 99)), 3)
+        },
+        'peak_frame_memory_kb': round(peak / 1024, 1),
+        'steady_frame_memory_kb': round(steady_peak / 1024, 1),
+        'retained_memory_kb': round(retained / 1024, 1),
+        'true_count': len(truth),
+        'detected_count': len(crossings),
+        'count_error': len(crossings) - len(truth),
+        'matched_crossings': len(pairs),
+        'speed_mae_kmh': round(float(np.mean(speed_errors)), 2) if speed_errors else None,
+        'speed_bias_kmh': round(float(np.mean([d['speed'] - t['speed'] for d, t in pairs if d['speed'] > 0])), 2)
+        if speed_errors else None
+    }
+
+
+def run_benchmarks(scenes, frames, seed):
+    results = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'frames': frames,
+            'seed': seed,
+            'parameters': {name: getattr(constants, name) for name in DETECTION_PARAMETERS}
+        },
+        'scenes': {}
+    }
+    for name in scenes:
+        print(f"Running {name}...")
+        result = run_scene(name, frames, seed)
+        results['scenes'][name] = result
+        print(f"  {result['fps']} fps, p95 {result['latency_ms']['p95']} ms, "
+              f"count {result['detected_count']}/{result['true_count']}, "
+              f"speed MAE {result['speed_mae_kmh']} km/h")
+    return results
+
+
+def flatten(values, prefix=''):
+    flat = {}
+    for key, value in values.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    for scene in sorted(set(old['scenes']) | set(new['scenes'])):
+        print(f"\n{scene}")
+        before = flatten(old['scenes'].get(scene, {}))
+        after = flatten(new['scenes'].get(scene, {}))
+        for key in sorted(set(before) | set(after)):
+            a, b = before.get(key), after.get(key)
+            change = ''
+            if isinstance(a, (int, float)) and isinstance(b, (int, float)) and a:
+                change = f"  ({(b - a) / abs(a) * 100:+.1f}%)"
+            print(f"  {key:28} {str(a):>10} -> {str(b):>10}{change}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='VehicleDetector Benchmarks')
+    parser.add_argument('--scenes', nargs='+', default=list(SCENES), choices=list(SCENES),
+                        help='Scenes to run (default: all)')
+    parser.add_argument('--frames', type=int, default=300,
+                        help='Frames per scene (default: 300)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Scene generator seed (default: 0)')
+    parser.add_argument('--output', type=str, default='benchmark_results.json',
+                        help='Results file (default: benchmark_results.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='Compare two results files instead of running')
+
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        results = run_benchmarks(args.scenes, args.frames, args.seed)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"\nResults saved to {args.output}")
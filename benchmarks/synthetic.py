@@ -0,0 +1,115 @@
+import cv2
+import numpy as np
+from app.utils.constants import *  # Import constants
+
+# Traffic density presets: lanes, gap between vehicles in a lane (pixels)
+# and lane speed (pixels per frame)
+SCENES = {
+    'sparse': {'lanes': 1, 'gap': (250, 400), 'speed': (6, 10)},
+    'moderate': {'lanes': 3, 'gap': (120, 250), 'speed': (5, 12)},
+    'dense': {'lanes': 5, 'gap': (60, 120), 'speed': (4, 12)},
+    'jammed': {'lanes': 5, 'gap': (20, 40), 'speed': (2, 4)}
+}
+
+
+def speed_kmh(pixels_per_frame, fps=FPS):
+    return pixels_per_frame * fps * METERS_PER_PIXEL * 3.6
+
+
+class SyntheticScene:
+    """Deterministic traffic video: textured rectangles moving down a noisy road.
+
+    Every lane has a constant speed, so vehicles in a lane never overlap.
+    ground_truth lists the frame at which the top of each vehicle first
+    reaches the detection line, which is when VehicleDetector counts it.
+    """
+
+    def __init__(self, name='moderate', frames=300, seed=0, noise=6, warmup=30,
+                 width=FRAME_WIDTH, height=FRAME_HEIGHT, fps=FPS):
+        self.name = name
+        self.frame_count = frames
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.noise = noise
+        self.warmup = warmup  # Empty-road frames before the first vehicle
+        self.line_y = int(height * DETECTION_LINE_POSITION)
+
+        rng = np.random.default_rng(seed)
+        self.background = self._make_background(rng)
+        self.vehicles = self._make_vehicles(rng, SCENES[name])
+        self.ground_truth = self._make_ground_truth()
+        self._seed = seed
+
+    def _make_background(self, rng):
+        # Static road texture with lane markings
+        road = rng.normal(100, 8, (self.height, self.width)).clip(0, 255).astype(np.uint8)
+        road = cv2.GaussianBlur(road, (7, 7), 0)
+        background = cv2.cvtColor(road, cv2.COLOR_GRAY2BGR)
+        return background
+
+    def _make_vehicles(self, rng, scene):
+        lane_width = self.width // scene['lanes']
+        vehicles = []
+        for lane in range(scene['lanes']):
+            speed = float(rng.uniform(*scene['speed']))
+            entry = self.warmup + float(rng.uniform(0, 30))
+            while entry < self.frame_count:
+                w = int(rng.integers(90, min(130, lane_width - 20) + 1))
+                h = int(rng.integers(70, 100))
+                x = lane * lane_width + int(rng.integers(5, lane_width - w - 5 + 1))
+                shade = int(rng.integers(150, 250))
+                vehicles.append({
+                    'id': len(vehicles),
+                    'lane': lane,
+                    'x': x, 'w': w, 'h': h,
+                    'speed': speed,
+                    'entry': entry,
+                    'color': (shade, int(rng.integers(60, 250)), int(rng.integers(60, 250)))
+                })
+                entry += (h + rng.uniform(*scene['gap'])) / speed
+        return vehicles
+
+    def _top(self, vehicle, frame_index):
+        return -vehicle['h'] + vehicle['speed'] * (frame_index - vehicle['entry'])
+
+    def _make_ground_truth(self):
+        truth = []
+        for vehicle in self.vehicles:
+            # First frame with the top of the box on or past the line
+            frame = int(np.ceil(vehicle['entry'] + (self.line_y + vehicle['h']) / vehicle['speed']))
+            if frame < self.frame_count:
+                truth.append({
+                    'vehicle_id': vehicle['id'],
+                    'frame': frame,
+                    'timestamp': frame / self.fps,
+                    'lane': vehicle['lane'],
+                    'x': vehicle['x'] + vehicle['w'] // 2,
+                    'speed': speed_kmh(vehicle['speed'], self.fps)
+                })
+        return sorted(truth, key=lambda t: t['frame'])
+
+    def _draw_vehicle(self, frame, vehicle, top):
+        x, w, h = vehicle['x'], vehicle['w'], vehicle['h']
+        y = int(round(top))
+        cv2.rectangle(frame, (x, y), (x + w - 1, y + h - 1), vehicle['color'], -1)
+
+        # Stripes give the body texture, so it does not melt into the background model
+        for stripe_y in range(y + 6, y + h - 6, 12):
+            cv2.line(frame, (x + 4, stripe_y), (x + w - 5, stripe_y), (30, 30, 30), 3)
+
+    def frames(self):
+        """Yield (frame, timestamp) for every frame of the scene."""
+        rng = np.random.default_rng(self._seed + 1)
+        noise = np.empty((self.height, self.width, 3), dtype=np.int16)
+        for index in range(self.frame_count):
+            frame = self.background.copy()
+            for vehicle in self.vehicles:
+                top = self._top(vehicle, index)
+                if -vehicle['h'] < top < self.height:
+                    self._draw_vehicle(frame, vehicle, top)
+
+            if self.noise:
+                noise[:] = rng.integers(-self.noise, self.noise + 1, noise.shape, dtype=np.int16)
+                frame = np.clip(frame + noise, 0, 255).astype(np.uint8)
+            yield frame, index / self.fps
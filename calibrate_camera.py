@@ -2,34 +2,54 @@ import cv2
 import numpy as np
 import argparse
 import json
+from app.utils.calibration import fit_homography
+from app.utils.config import ConfigFile, config_path
 
 class CameraCalibrator:
-    def __init__(self):
+    def __init__(self, camera='main'):
+        self.camera = camera
         self.points = []
-        self.reference_distance = 2.0  # meters
+        # Road surface positions in meters of the points to click, in click order
+        self.world_points = [(0, 0), (3.5, 0), (3.5, 10), (0, 10)]
         self.calibration_results = {
-            'meters_per_pixel': 0,
+            'homography': None,
+            'image_size': None,
             'vehicle_width': 0,
             'vehicle_height': 0,
             'min_area': 0
         }
         
     def mouse_callback(self, event, x, y, flags, param):
-        if event == cv2.EVENT_LBUTTONDOWN:
+        if event == cv2.EVENT_LBUTTONDOWN and len(self.points) < len(self.world_points):
             self.points.append((x, y))
             cv2.circle(self.frame, (x, y), 3, (0, 255, 0), -1)
+            wx, wy = self.world_points[len(self.points) - 1]
+            cv2.putText(self.frame, f"({wx}, {wy})", (x + 5, y - 5),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
             
-            if len(self.points) == 2:
-                cv2.line(self.frame, self.points[0], self.points[1], (0, 255, 0), 2)
-                pixel_distance = np.sqrt(
-                    (self.points[1][0] - self.points[0][0])**2 + 
-                    (self.points[1][1] - self.points[0][1])**2
-                )
-                self.calibration_results['meters_per_pixel'] = self.reference_distance / pixel_distance
-                print(f"\nDistance Calibration:")
-                print(f"Reference distance: {self.reference_distance} meters")
-                print(f"Pixel distance: {pixel_distance:.2f} pixels")
-                print(f"Meters per pixel: {self.calibration_results['meters_per_pixel']:.6f}")
+            if len(self.points) == len(self.world_points):
+                self.fit_ground_plane()
+    
+    def fit_ground_plane(self):
+        try:
+            homography = fit_homography(self.points, self.world_points)
+        except ValueError as e:
+            print(f"\nError: {str(e)}")
+            return
+        
+        height, width = self.frame.shape[:2]
+        self.calibration_results['homography'] = homography
+        self.calibration_results['image_size'] = (width, height)
+        
+        # Reprojection error tells whether the points were clicked accurately
+        projected = cv2.perspectiveTransform(
+            np.array(self.points, dtype=np.float64).reshape(-1, 1, 2), homography
+        ).reshape(-1, 2)
+        error = np.hypot(*(projected - np.array(self.world_points)).T)
+        print(f"\nGround Plane Calibration:")
+        print(f"Points: {len(self.points)}")
+        print(f"Mean reprojection error: {error.mean():.3f} meters")
+        print(f"Max reprojection error: {error.max():.3f} meters")
     
     def measure_vehicle(self):
         print("\nDraw rectangle around a typical vehicle (click and drag)")
@@ -66,7 +86,7 @@ class CameraCalibrator:
     def calibrate(self, source=0):
         print("\nCamera Calibration Tool")
         print("=======================")
-        print("1. Mark two points of known distance (e.g., 2 meters)")
+        print(f"1. Click {len(self.world_points)} road points at these positions (meters): {self.world_points}")
         print("2. Draw rectangle around a typical vehicle")
         print("3. Press 'q' to save and quit")
         print("\nStarting camera...")
@@ -87,14 +107,14 @@ class CameraCalibrator:
             cv2.namedWindow('Calibration')
             cv2.setMouseCallback('Calibration', self.mouse_callback)
             
-            print("\nStep 1: Click two points of known distance")
+            print("\nStep 1: Click the road points in order")
             while True:
                 cv2.imshow('Calibration', self.frame)
-                if cv2.waitKey(1) & 0xFF == ord('q') or len(self.points) == 2:
+                if cv2.waitKey(1) & 0xFF == ord('q') or len(self.points) == len(self.world_points):
                     break
             
-            # Measure vehicle only if distance calibration was successful
-            if len(self.points) == 2:
+            # Measure vehicle only if ground plane calibration was successful
+            if self.calibration_results['homography'] is not None:
                 self.measure_vehicle()
             
             # Clean up
@@ -102,7 +122,7 @@ class CameraCalibrator:
             cv2.destroyAllWindows()
             
             # Save calibration results
-            if self.calibration_results['meters_per_pixel'] > 0 and self.calibration_results['min_area'] > 0:
+            if self.calibration_results['homography'] is not None and self.calibration_results['min_area'] > 0:
                 self.save_calibration()
                 return True
             else:
@@ -115,44 +135,47 @@ class CameraCalibrator:
             
     def save_calibration(self):
         try:
-            # Save to constants.py
-            with open('app/utils/constants.py', 'r') as f:
-                lines = f.readlines()
+            # Save to the camera's config; running detectors pick it up
+            path = config_path(self.camera)
+            ConfigFile(path).update({
+                'homography': self.calibration_results['homography'].tolist(),
+                'image_size': list(self.calibration_results['image_size']),
+                'min_contour_area': float(self.calibration_results['min_area'])
+            })
             
-            with open('app/utils/constants.py', 'w') as f:
-                for line in lines:
-                    if 'METERS_PER_PIXEL =' in line:
-                        f.write(f"METERS_PER_PIXEL = {self.calibration_results['meters_per_pixel']}  # Calibrated value\n")
-                    elif 'MIN_CONTOUR_AREA =' in line:
-                        f.write(f"MIN_CONTOUR_AREA = {self.calibration_results['min_area']}  # Calibrated value\n")
-                    elif 'vehicle_width =' in line:
-                        f.write(f"vehicle_width = {self.calibration_results['vehicle_width']}  # Calibrated value\n")
-                    elif 'vehicle_height =' in line:
-                        f.write(f"vehicle_height = {self.calibration_results['vehicle_height']}  # Calibrated value\n")
-                    else:
-                        f.write(line)
-                        
-            print("\nCalibration values saved successfully!")
-            print("You can now run the main application.")
+            print(f"\nCalibration values saved to {path}")
+            print("Running streams of this camera apply them within a second.")
             
         except Exception as e:
             print(f"\nError saving calibration: {str(e)}")
             # Save to backup file
+            results = dict(self.calibration_results)
+            if results['homography'] is not None:
+                results['homography'] = results['homography'].tolist()
             with open('calibration_results.json', 'w') as f:
-                json.dump(self.calibration_results, f, indent=4)
+                json.dump(results, f, indent=4)
             print("Calibration results saved to calibration_results.json")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Camera Calibration Tool')
     parser.add_argument('--source', type=str, default='0',
                         help='Camera index or video file (default: 0)')
-    parser.add_argument('--distance', type=float, default=2.0,
-                        help='Reference distance in meters (default: 2.0)')
+    parser.add_argument('--camera', type=str, default='main',
+                        help="Camera to calibrate: 'main' or a stream id (default: main)")
+    parser.add_argument('--width', type=float, default=3.5,
+                        help='Width in meters of the road rectangle to click (default: 3.5, one lane)')
+    parser.add_argument('--length', type=float, default=10.0,
+                        help='Length in meters of the road rectangle to click (default: 10.0)')
+    parser.add_argument('--world', type=str, default=None,
+                        help='JSON list of 4+ [x, y] road positions in meters, instead of a rectangle')
     
     args = parser.parse_args()
     
-    calibrator = CameraCalibrator()
-    calibrator.reference_distance = args.distance
+    calibrator = CameraCalibrator(args.camera)
+    if args.world:
+        calibrator.world_points = [tuple(p) for p in json.loads(args.world)]
+    else:
+        calibrator.world_points = [(0, 0), (args.width, 0), (args.width, args.length), (0, args.length)]
     
     # Handle both camera index and video file
     source = int(args.source) if args.source.isdigit() else args.source
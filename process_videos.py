@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import time
+from multiprocessing import Pool, cpu_count
+
+from app.utils.constants import BG_HISTORY, VIDEO_EXTENSIONS
+from app.utils.detection_cache import DetectionCache, file_digest
+from app.utils.video_analysis import analyze_video, count_frames, init_worker
+
+
+def find_videos(paths):
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(VIDEO_EXTENSIONS):
+                    videos.append(os.path.join(path, name))
+        else:
+            videos.append(path)
+    return videos
+
+
+def make_tasks(videos, chunks, warmup, use_cache=True):
+    """Split every video into time slices of roughly equal length."""
+    tasks = []
+    for path in videos:
+        total = count_frames(path)
+        if chunks <= 1 or total <= 0:
+            tasks.append((path, 0, None, 0, use_cache, None))
+            continue
+
+        # Hash a split video once here rather than once in every worker
+        digest = file_digest(path) if use_cache else None
+        size = -(-total // chunks)
+        for start in range(0, total, size):
+            tasks.append((path, start, min(start + size, total), warmup, use_cache, digest))
+    return tasks
+
+
+def run_task(task):
+    path, start, end, warmup, use_cache, digest = task
+    try:
+        cache = DetectionCache() if use_cache else None
+        return analyze_video(path, start, end, warmup, cache=cache, digest=digest)
+    except Exception as e:
+        return {'source': path, 'start_frame': start, 'error': str(e)}
+
+
+def merge_results(results):
+    files = {}
+    for result in sorted(results, key=lambda r: (r['source'], r['start_frame'])):
+        entry = files.setdefault(result['source'], {
+            'vehicle_count': 0,
+            'frames': 0,
+            'crossings': [],
+            'errors': []
+        })
+        if 'error' in result:
+            entry['errors'].append(result['error'])
+            continue
+        entry['vehicle_count'] += result['vehicle_count']
+        entry['frames'] += result['frames']
+        entry['crossings'].extend(result['crossings'])
+
+    all_speeds = []
+    for entry in files.values():
+        speeds = [c['speed'] for c in entry['crossings'] if c['speed'] > 0]
+        entry['average_speed'] = round(sum(speeds) / len(speeds), 2) if speeds else 0
+        entry['max_speed'] = round(max(speeds), 2) if speeds else 0
+        all_speeds.extend(speeds)
+
+    return {
+        'total_vehicle_count': sum(e['vehicle_count'] for e in files.values()),
+        'total_frames': sum(e['frames'] for e in files.values()),
+        'average_speed': round(sum(all_speeds) / len(all_speeds), 2) if all_speeds else 0,
+        'files': files
+    }
+
+
+def process_videos(videos, workers, chunks=1, warmup=BG_HISTORY, use_cache=True):
+    tasks = make_tasks(videos, chunks, warmup, use_cache)
+    print(f"Processing {len(videos)} video(s) as {len(tasks)} task(s) on {workers} worker(s)")
+
+    started = time.time()
+    results = []
+    with Pool(workers, initializer=init_worker) as pool:
+        for result in pool.imap_unordered(run_task, tasks):
+            results.append(result)
+            if 'error' in result:
+                print(f"Error processing {result['source']}: {result['error']}")
+            else:
+                cached = f" (cached {result['cache']})" if result.get('cache') in ('boxes', 'result') else ''
+                print(f"{result['source']} [{result['start_frame']}:{result['end_frame']}] "
+                      f"{result['vehicle_count']} vehicles, "
+                      f"{result['frames'] / max(result['processing_time'], 1e-6):.1f} fps{cached}")
+
+    report = merge_results(results)
+    report['processing_time'] = round(time.time() - started, 3)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Batch Vehicle Detection')
+    parser.add_argument('inputs', nargs='+',
+                        help='Video files or directories of videos')
+    parser.add_argument('--workers', type=int, default=cpu_count(),
+                        help='Number of worker processes (default: CPU count)')
+    parser.add_argument('--chunks', type=int, default=1,
+                        help='Split each video into this many time slices (default: 1)')
+    parser.add_argument('--warmup', type=int, default=BG_HISTORY,
+                        help=f'Frames replayed before each slice to settle the background model (default: {BG_HISTORY})')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always decode and detect, ignoring the detection cache')
+    parser.add_argument('--output', type=str, default='report.json',
+                        help='Report file (default: report.json)')
+
+    args = parser.parse_args()
+
+    videos = find_videos(args.inputs)
+    if not videos:
+        print("No videos found")
+    else:
+        report = process_videos(videos, args.workers, args.chunks, args.warmup,
+                                not args.no_cache)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f"\nTotal vehicles: {report['total_vehicle_count']}")
+        print(f"Average speed: {report['average_speed']} km/h")
+        print(f"Report saved to {args.output}")
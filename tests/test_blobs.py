@@ -0,0 +1,45 @@
+import cv2
+import numpy as np
+
+from app.utils.blobs import component_blobs, component_table, contour_blobs, contour_table
+
+
+def make_mask(*rects, shape=(200, 300)):
+    mask = np.zeros(shape, dtype=np.uint8)
+    for x, y, w, h in rects:
+        mask[y:y + h, x:x + w] = 255
+    return mask
+
+
+def sorted_boxes(boxes):
+    return sorted(map(tuple, np.asarray(boxes).tolist()))
+
+
+def test_backends_agree_on_separate_blobs():
+    mask = make_mask((10, 10, 40, 30), (80, 20, 60, 50), (200, 100, 30, 60), (5, 150, 4, 4))
+    cv2.ellipse(mask, (150, 150), (40, 20), 0, 0, 360, 255, -1)
+
+    args = (100, 0.2, 5.0)
+    assert sorted_boxes(contour_blobs(mask, *args)) == sorted_boxes(component_blobs(mask, *args))
+    assert len(contour_blobs(mask, *args)) == 4  # The 4x4 speck is filtered out
+
+
+def test_backends_agree_on_hollow_and_diagonally_touching_blobs():
+    mask = make_mask((20, 20, 60, 40), (150, 50, 30, 30), (180, 80, 30, 30))
+    mask[30:50, 30:70] = 0  # A hole leaves one blob with the same box
+
+    assert sorted_boxes(contour_table(mask)[0]) == sorted_boxes(component_table(mask)[0])
+    assert len(contour_table(mask)[0]) == 2  # Corner-touching squares are one blob
+
+
+def test_area_measures_differ_at_the_threshold():
+    # Contours measure the polygon through the boundary pixel centres, so a
+    # solid w x h box has area (w - 1) * (h - 1); components count w * h
+    # pixels. Blobs right at min_area can pass one backend and not the other.
+    mask = make_mask((10, 10, 50, 40))
+    assert contour_table(mask)[1].tolist() == [49 * 39]
+    assert component_table(mask)[1].tolist() == [50 * 40]
+
+    assert len(contour_blobs(mask, 2000, 0.2, 5.0)) == 0
+    assert len(component_blobs(mask, 2000, 0.2, 5.0)) == 1
+    assert len(contour_blobs(mask, 1900, 0.2, 5.0)) == len(component_blobs(mask, 1900, 0.2, 5.0)) == 1
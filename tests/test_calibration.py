@@ -0,0 +1,43 @@
+import numpy as np
+
+from app.utils.calibration import GroundPlane, fit_homography
+
+FRAME_SIZE = (800, 600)
+
+
+def project(world, height=6.0, pitch=15.0, focal=800.0, centre=(400.0, 300.0)):
+    """Pixels of ground points (X right, Y forward, metres) seen by a pitched camera."""
+    pitch = np.radians(pitch)
+    right = np.array([1.0, 0.0, 0.0])
+    forward = np.array([0.0, np.cos(pitch), -np.sin(pitch)])
+    down = np.array([0.0, -np.sin(pitch), -np.cos(pitch)])
+
+    world = np.asarray(world, dtype=np.float64)
+    rays = np.column_stack([world[:, 0], world[:, 1], np.full(len(world), -height)])
+    depth = rays @ forward
+    return np.column_stack([focal * (rays @ right) / depth + centre[0],
+                            focal * (rays @ down) / depth + centre[1]])
+
+
+def test_ground_plane_with_visible_horizon():
+    # 15 degrees down from 6 m puts the horizon near row 86, so the top-left
+    # pixel is sky and h33 = 1 would make every road pixel negative
+    world = np.array([[-3.0, 15.0], [3.0, 15.0], [3.0, 40.0], [-3.0, 40.0]])
+    image = project(world)
+    ground = GroundPlane(fit_homography(image, world).tolist(), list(FRAME_SIZE))
+
+    mapped = ground.to_world(image, FRAME_SIZE)
+    assert np.all(np.isfinite(mapped))
+    assert np.allclose(mapped, world, rtol=0.01, atol=0.05)
+
+    # A point between the calibration marks, and sky above the horizon
+    inside = project([[1.0, 25.0]])
+    assert np.allclose(ground.to_world(inside, FRAME_SIZE), [[1.0, 25.0]], rtol=0.01, atol=0.05)
+    assert np.all(np.isnan(ground.to_world([[400, 20]], FRAME_SIZE)))
+
+
+def test_ground_plane_with_horizon_out_of_frame():
+    world = np.array([[-2.0, 6.0], [2.0, 6.0], [2.0, 12.0], [-2.0, 12.0]])
+    image = project(world, pitch=45.0)
+    ground = GroundPlane(fit_homography(image, world).tolist(), list(FRAME_SIZE))
+    assert np.allclose(ground.to_world(image, FRAME_SIZE), world, rtol=0.01, atol=0.05)
@@ -0,0 +1,55 @@
+import itertools
+
+import numpy as np
+
+from app.utils.tracking import linear_assignment, match_boxes
+
+
+def brute_force_cost(cost):
+    """Lowest total cost over every assignment of the smaller side."""
+    n, m = cost.shape
+    if n <= m:
+        return min(cost[range(n), list(cols)].sum() for cols in itertools.permutations(range(m), n))
+    return min(cost[list(rows), range(m)].sum() for rows in itertools.permutations(range(n), m))
+
+
+def test_linear_assignment_matches_brute_force():
+    rng = np.random.default_rng(0)
+    for _ in range(400):
+        n, m = rng.integers(1, 6, size=2)
+        # Few distinct values, so ties and zero costs are common
+        cost = rng.integers(-3, 2, size=(n, m)).astype(np.float64)
+        if rng.random() < 0.5:
+            cost = rng.random((n, m)) - 0.5
+
+        rows, cols = linear_assignment(cost)
+        assert len(rows) == len(cols) == min(n, m)
+        assert len(set(rows.tolist())) == len(rows)
+        assert len(set(cols.tolist())) == len(cols)
+        assert np.isclose(cost[rows, cols].sum(), brute_force_cost(cost))
+
+
+def test_linear_assignment_empty():
+    rows, cols = linear_assignment(np.zeros((0, 3)))
+    assert len(rows) == len(cols) == 0
+
+
+def test_two_detections_overlapping_one_track():
+    # Both detections overlap the first track; greedy matching would give it
+    # to the first detection and leave the better match for the second
+    tracks = [[100, 100, 50, 50], [140, 100, 50, 50]]
+    detections = [[120, 100, 50, 50], [102, 100, 50, 50]]
+
+    matches, unmatched_detections, unmatched_tracks = match_boxes(detections, tracks, 0.3)
+    assert sorted(matches) == [(0, 1), (1, 0)]
+    assert unmatched_detections == [] and unmatched_tracks == []
+
+
+def test_second_detection_on_a_taken_track_is_new():
+    tracks = [[100, 100, 50, 50]]
+    detections = [[105, 100, 50, 50], [110, 100, 50, 50]]
+
+    matches, unmatched_detections, unmatched_tracks = match_boxes(detections, tracks, 0.3)
+    assert matches == [(0, 0)]
+    assert unmatched_detections == [1]
+    assert unmatched_tracks == []
@@ -0,0 +1,206 @@
+import argparse
+import itertools
+import json
+import os
+import time
+from multiprocessing import Pool, cpu_count
+
+import cv2
+import numpy as np
+
+from app.utils.blobs import filter_blobs
+from app.utils.config import ConfigFile, config_path
+from app.utils.constants import (
+    FRAME_WIDTH, FRAME_HEIGHT, MIN_CONTOUR_AREA, MIN_ASPECT_RATIO, MAX_ASPECT_RATIO,
+    IOU_THRESHOLD, POSITIONS_HISTORY, SPEED_HISTORY
+)
+from app.utils.tracking import TrackStore
+from app.utils.vehicle_detection import VehicleDetector
+from app.utils.video_analysis import decoded_frames, init_worker
+
+PARAMETERS = ('min_contour_area', 'min_aspect_ratio', 'max_aspect_ratio', 'iou_threshold',
+              'positions_history')
+
+
+def load_labels(path):
+    """Clips and their true counts from an annotation file.
+
+    The file maps video paths, relative to the file itself, to a vehicle
+    count or to {"count": n, "average_speed": km/h}.
+    """
+    with open(path) as f:
+        data = json.load(f)
+
+    base = os.path.dirname(os.path.abspath(path))
+    labels = {}
+    for video, label in data.items():
+        if not isinstance(label, dict):
+            label = {'count': label}
+        labels[os.path.join(base, video)] = label
+    return labels
+
+
+# Set in each worker process by init_tuning_worker
+_tables = None
+_camera = None
+
+
+def init_tuning_worker(tables=None, camera=None):
+    init_worker()
+    global _tables, _camera
+    _tables = tables
+    _camera = camera
+
+
+def extract_table(task):
+    """Run background subtraction and morphology once over a clip and keep every blob."""
+    path, min_area = task
+    detector = VehicleDetector(_camera)
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video: {path}")
+
+    boxes, areas, counts, timestamps = [], [], [], []
+    try:
+        for _, frame, timestamp in decoded_frames(cap):
+            frame_boxes, frame_areas = detector.blob_table(frame)
+            # Blobs below the smallest area in the grid can never pass the filter
+            keep = frame_areas >= min_area
+            boxes.append(frame_boxes[keep])
+            areas.append(frame_areas[keep])
+            counts.append(int(keep.sum()))
+            timestamps.append(timestamp)
+    finally:
+        cap.release()
+
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return {
+        'path': path,
+        'boxes': np.concatenate(boxes).astype(np.int32) if boxes else np.zeros((0, 4), np.int32),
+        'areas': np.concatenate(areas).astype(np.float32) if areas else np.zeros(0, np.float32),
+        'offsets': offsets,
+        'timestamps': np.asarray(timestamps, dtype=np.float64)
+    }
+
+
+def evaluate(params):
+    """Vehicle count and average speed of every clip under one parameter set."""
+    min_area, min_aspect, max_aspect, iou, positions = params
+    results = {}
+    for table in _tables:
+        detector = VehicleDetector(_camera)
+        detector.ref_iou = iou
+        detector.tracks = TrackStore(positions_history=positions, speed_history=SPEED_HISTORY)
+
+        speeds = []
+        offsets = table['offsets']
+        for i, timestamp in enumerate(table['timestamps']):
+            start, end = offsets[i], offsets[i + 1]
+            boxes = filter_blobs(table['boxes'][start:end], table['areas'][start:end],
+                                 min_area, min_aspect, max_aspect)
+            detector.process_boxes(boxes, timestamp, (FRAME_WIDTH, FRAME_HEIGHT))
+            speeds.extend(c['speed'] for c in detector.crossings if c['speed'] > 0)
+
+        results[table['path']] = {
+            'count': detector.vehicle_count,
+            'average_speed': round(sum(speeds) / len(speeds), 2) if speeds else 0
+        }
+    return params, results
+
+
+def score(results, labels):
+    """(mean relative count error, mean relative speed error); lower is better."""
+    count_errors = []
+    speed_errors = []
+    for path, label in labels.items():
+        result = results[path]
+        count_errors.append(abs(result['count'] - label['count']) / max(label['count'], 1))
+        if label.get('average_speed'):
+            speed_errors.append(abs(result['average_speed'] - label['average_speed']) /
+                                label['average_speed'])
+    return (float(np.mean(count_errors)),
+            float(np.mean(speed_errors)) if speed_errors else 0.0)
+
+
+def tune(labels, grid, workers, camera=None):
+    videos = list(labels)
+    print(f"Extracting blobs from {len(videos)} clip(s)")
+    started = time.time()
+    with Pool(min(workers, len(videos)), initializer=init_tuning_worker, initargs=(None, camera)) as pool:
+        tables = pool.map(extract_table, [(path, min(grid[0])) for path in videos])
+    blobs = sum(len(table['areas']) for table in tables)
+    print(f"{blobs} blobs in {sum(len(t['timestamps']) for t in tables)} frames "
+          f"({time.time() - started:.1f}s)")
+
+    combinations = list(itertools.product(*grid))
+    print(f"Evaluating {len(combinations)} parameter sets on {workers} worker(s)")
+    started = time.time()
+    ranked = []
+    with Pool(workers, initializer=init_tuning_worker, initargs=(tables, camera)) as pool:
+        for params, results in pool.imap_unordered(evaluate, combinations, chunksize=4):
+            ranked.append((score(results, labels), params, results))
+            if len(ranked) % max(1, len(combinations) // 10) == 0:
+                print(f"  {len(ranked)}/{len(combinations)} ({time.time() - started:.1f}s)")
+
+    ranked.sort(key=lambda r: (r[0], r[1]))
+    return ranked, time.time() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Detection Parameter Tuning')
+    parser.add_argument('labels',
+                        help='JSON file mapping video paths to true vehicle counts')
+    parser.add_argument('--min-area', type=float, nargs='+',
+                        default=[MIN_CONTOUR_AREA * f for f in (0.5, 0.75, 1.0, 1.25, 1.5)],
+                        help='MIN_CONTOUR_AREA values to try')
+    parser.add_argument('--min-aspect', type=float, nargs='+', default=[0.3, MIN_ASPECT_RATIO, 0.5],
+                        help='MIN_ASPECT_RATIO values to try')
+    parser.add_argument('--max-aspect', type=float, nargs='+', default=[2.0, MAX_ASPECT_RATIO, 3.0],
+                        help='MAX_ASPECT_RATIO values to try')
+    parser.add_argument('--iou', type=float, nargs='+', default=[0.3, IOU_THRESHOLD, 0.6],
+                        help='IOU_THRESHOLD values to try')
+    parser.add_argument('--positions', type=int, nargs='+', default=[5, POSITIONS_HISTORY, 15],
+                        help='POSITIONS_HISTORY values to try')
+    parser.add_argument('--camera', type=str, default=None,
+                        help='Use the saved config of this camera for everything not being tuned')
+    parser.add_argument('--workers', type=int, default=cpu_count(),
+                        help='Number of worker processes (default: CPU count)')
+    parser.add_argument('--top', type=int, default=10,
+                        help='Number of best parameter sets to show (default: 10)')
+    parser.add_argument('--output', type=str, default='tuning.json',
+                        help='Result file (default: tuning.json)')
+    parser.add_argument('--apply', action='store_true',
+                        help="Write the best filter and tracker settings to the camera's config")
+
+    args = parser.parse_args()
+
+    labels = load_labels(args.labels)
+    grid = [sorted(set(args.min_area)), sorted(set(args.min_aspect)), sorted(set(args.max_aspect)),
+            sorted(set(args.iou)), sorted(set(args.positions))]
+    ranked, elapsed = tune(labels, grid, args.workers, args.camera)
+
+    print(f"\nBest of {len(ranked)} parameter sets ({elapsed:.1f}s):")
+    print(f"{'count err':>10} {'speed err':>10}  " + ' '.join(f"{name:>17}" for name in PARAMETERS))
+    for (count_error, speed_error), params, _ in ranked[:args.top]:
+        print(f"{count_error:>10.3f} {speed_error:>10.3f}  " + ' '.join(f"{p:>17g}" for p in params))
+
+    (count_error, speed_error), params, results = ranked[0]
+    best = dict(zip(PARAMETERS, params))
+    with open(args.output, 'w') as f:
+        json.dump({
+            'count_error': count_error,
+            'speed_error': speed_error,
+            'parameters': best,
+            'results': results,
+            'labels': labels
+        }, f, indent=4)
+    print(f"Results saved to {args.output}")
+
+    if args.apply:
+        camera = args.camera or 'main'
+        ConfigFile(config_path(camera)).update(
+            {name: value for name, value in best.items() if name != 'positions_history'}
+        )
+        print(f"Settings saved to {config_path(camera)}; "
+              f"set POSITIONS_HISTORY = {best['positions_history']} in constants.py")